@@ -0,0 +1,97 @@
+import ctypes
+import ctypes.util
+import os
+
+from loguru import logger
+
+AT_FDCWD = -100
+STATX_BTIME = 0x00000800
+CACHE_MAX_SIZE = 10000
+
+
+class StatxTimestamp(ctypes.Structure):
+    _fields_ = [
+        ('tv_sec', ctypes.c_int64),
+        ('tv_nsec', ctypes.c_uint32),
+        ('reserved', ctypes.c_int32),
+    ]
+
+
+class Statx(ctypes.Structure):
+    _fields_ = [
+        ('stx_mask', ctypes.c_uint32),
+        ('stx_blksize', ctypes.c_uint32),
+        ('stx_attributes', ctypes.c_uint64),
+        ('stx_nlink', ctypes.c_uint32),
+        ('stx_uid', ctypes.c_uint32),
+        ('stx_gid', ctypes.c_uint32),
+        ('stx_mode', ctypes.c_uint16),
+        ('spare0', ctypes.c_uint16),
+        ('stx_ino', ctypes.c_uint64),
+        ('stx_size', ctypes.c_uint64),
+        ('stx_blocks', ctypes.c_uint64),
+        ('stx_attributes_mask', ctypes.c_uint64),
+        ('stx_atime', StatxTimestamp),
+        ('stx_btime', StatxTimestamp),
+        ('stx_ctime', StatxTimestamp),
+        ('stx_mtime', StatxTimestamp),
+        ('spare', ctypes.c_uint8 * 128),
+    ]
+
+
+class BirthTimeProvider:
+    """Creation time via statx(STATX_BTIME), falls back to mtime. Memoized per (device, inode, mtime)."""
+
+    def __init__(self):
+        self.cache = {}
+        self.statx = self.load_statx()
+
+    @staticmethod
+    def load_statx():
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return None
+        try:
+            statx = ctypes.CDLL(libc_name, use_errno=True).statx
+        except (OSError, AttributeError):
+            return None
+        statx.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint, ctypes.POINTER(Statx)]
+        statx.restype = ctypes.c_int
+        return statx
+
+    def get_birth_time(self, file_path, stat_result=None):
+        stat_result = stat_result or os.stat(file_path)
+        cache_key = (stat_result.st_dev, stat_result.st_ino, stat_result.st_mtime_ns)
+
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+
+        birth_time = getattr(stat_result, 'st_birthtime', None) or self.read_statx_btime(file_path)
+
+        if birth_time:
+            creation_time = min(stat_result.st_mtime, birth_time)
+        else:
+            creation_time = stat_result.st_mtime
+
+        if len(self.cache) >= CACHE_MAX_SIZE:
+            self.cache.pop(next(iter(self.cache)))
+        self.cache[cache_key] = creation_time
+
+        return creation_time
+
+    def read_statx_btime(self, file_path):
+        if not self.statx:
+            return None
+
+        buffer = Statx()
+        if self.statx(AT_FDCWD, os.fsencode(file_path), 0, STATX_BTIME, ctypes.byref(buffer)) != 0:
+            logger.debug(f'statx failed for {file_path}: {os.strerror(ctypes.get_errno())}')
+            return None
+
+        if not buffer.stx_mask & STATX_BTIME:
+            return None
+
+        return buffer.stx_btime.tv_sec + buffer.stx_btime.tv_nsec / 1e9
+
+
+birth_time_provider = BirthTimeProvider()
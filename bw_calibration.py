@@ -0,0 +1,58 @@
+import argparse
+import os
+import time
+
+from PIL import Image
+
+from image_enhancer import ImageEnhancer
+
+
+def legacy_is_black_white(image):
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    colors = set(image.getdata())
+
+    return True if len(colors) < 600 else False
+
+
+def calibrate(folder, extension, limit=None):
+    image_files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(extension))
+    image_files = image_files[:limit] if limit else image_files
+
+    mismatches = []
+    legacy_time = detector_time = 0
+    black_white_count = 0
+
+    for image_file in image_files:
+        with Image.open(image_file) as image:
+            image.load()
+
+            started = time.perf_counter()
+            legacy_result = legacy_is_black_white(image)
+            legacy_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            detector_result = ImageEnhancer.is_black_white(image)
+            detector_time += time.perf_counter() - started
+
+        black_white_count += legacy_result
+        if legacy_result != detector_result:
+            mismatches.append(image_file)
+            print(f'MISMATCH {image_file}: legacy={legacy_result} detector={detector_result}')
+
+    print(f'images: {len(image_files)}, black and white: {black_white_count}, mismatches: {len(mismatches)}')
+    if image_files:
+        print(f'legacy set(getdata()): {legacy_time:.3f}s total, {legacy_time / len(image_files) * 1000:.1f} ms/image')
+        print(f'getcolors detector: {detector_time:.3f}s total, {detector_time / len(image_files) * 1000:.1f} ms/image')
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare is_black_white with the old set(getdata()) heuristic")
+    parser.add_argument("folder", help="Folder with sample photos")
+    parser.add_argument("--extension", default='.jpg')
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    calibrate(args.folder, args.extension.lower(), args.limit)
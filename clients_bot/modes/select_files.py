@@ -8,7 +8,6 @@ from aiogram.types import (
     Message, LabeledPrice, InlineKeyboardMarkup,
     InlineKeyboardButton, Document, CallbackQuery, FSInputFile)
 from datetime import datetime
-from PIL import Image, ImageOps
 from dotenv import load_dotenv
 
 from clients_bot.bot_setup import logger, bot
@@ -20,6 +19,7 @@ from clients_bot.utils import (
     remove_task_folder, get_folder_files_list)
 from clients_bot.enhance_backend_api import EnhanceBackendAPI
 from enhance_backend.models import StatusEnum
+from preview_generator import preview_generator
 
 load_dotenv()
 YOOKASSA_PROVIDER_TOKEN = os.getenv("YOOKASSA_PROVIDER_TOKEN")
@@ -158,18 +158,10 @@ async def put_all_photos_to_files_list(folder_path):
     return files
 
 
-async def compress_image(image_name, image_path):
-    new_name = image_name.replace('.jpg', "_compressed.jpg")
-    output_path = os.path.join(os.getcwd(), "photos", new_name)
-
-    if not os.path.exists(output_path):
-        with Image.open(image_path) as img:
-            img = ImageOps.exif_transpose(img)
-            img = img.convert("RGB")
-            img.thumbnail((700, 700))
-            img.save(output_path, "JPEG", quality=55)
-
-    return new_name
+def example_photo(filename):
+    # the 700px preview once it is cached, the original until then
+    photo_path = f"/cloud/copy_script/clients_bot/photos/{filename}"
+    return FSInputFile(preview_generator.cached_preview(photo_path, 700, 55) or photo_path)
 
 
 @form_router.message(SelectFilesForm.create_user)
@@ -884,8 +876,7 @@ async def retouches_settings(message: Message, state: FSMContext):
 
     try:
         for setting, filename in retouches_select_photos.items():
-            photo = FSInputFile(f"/cloud/copy_script/clients_bot/photos/{filename}")
-            await message.answer_photo(photo, caption=setting)
+            await message.answer_photo(example_photo(filename), caption=setting)
     except Exception as e:
         logger.error(e)
 
@@ -932,8 +923,7 @@ async def tone_settings(callback: CallbackQuery, state: FSMContext):
 
     try:
         for setting, filename in tone_select_photos_mapping[retouches_setting].items():
-            photo = FSInputFile(f"/cloud/copy_script/clients_bot/photos/{filename}")
-            await callback.message.answer_photo(photo, caption=setting)
+            await callback.message.answer_photo(example_photo(filename), caption=setting)
     except Exception as e:
         logger.error(e)
 
@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 from os import environ
 
 from clients_bot.bot_setup import logger
+from index_service import request_index_async
 
 load_dotenv()
 backend_port = environ.get('BACKEND_PORT')
@@ -51,17 +52,13 @@ async def prepare_enhance_task(
 
 
 async def run_indexing(path):
-    path = path.replace('/cloud', '')
-    command = f"echo {sudo_password} | sudo -S -u www-data php /var/www/cloud/occ files:scan -p '{path}' --shallow"
-    path = os.path.dirname(path)
-    logger.info(command)
+    logger.info(f'index request: {path}')
 
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, error = process.communicate()
+    result = await request_index_async(path)
 
-    logger.info(output)
+    logger.info(result.get('output'))
 
-    if process.returncode == 0:
+    if result.get('ok'):
         return "Индексация произведена успешно"
 
     else:
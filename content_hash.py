@@ -0,0 +1,35 @@
+import hashlib
+import os
+
+hash_modes = ('sample', 'full')
+
+
+class ContentHasher:
+    """
+    blake2b over the whole file, or in sample mode over the file size plus its first and last
+    sample_size bytes. Camera files carry EXIF and sequence data in the head, so the sample is
+    enough to tell a re-uploaded frame from a new one without reading the full file.
+    """
+
+    def __init__(self, mode='sample', sample_size=64 * 1024):
+        if mode not in hash_modes:
+            raise ValueError(f'unknown dedup mode {mode}, expected one of {hash_modes}')
+        self.mode = mode
+        self.sample_size = sample_size
+
+    def digest(self, file_path):
+        file_hash = hashlib.blake2b(digest_size=16)
+
+        with open(file_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            file_hash.update(size.to_bytes(8, 'little'))
+
+            if self.mode == 'full' or size <= 2 * self.sample_size:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    file_hash.update(chunk)
+            else:
+                file_hash.update(file.read(self.sample_size))
+                file.seek(size - self.sample_size)
+                file_hash.update(file.read(self.sample_size))
+
+        return file_hash.hexdigest()
@@ -2,7 +2,6 @@ import os
 import json
 import signal
 import subprocess
-import time
 from enum import Enum
 
 import pytz
@@ -15,7 +14,9 @@ from datetime import datetime
 from dotenv import load_dotenv
 from os import environ
 
-from photos_copy_script import FileCopier, read_config
+from hour_events import HourEventQueue, check_seal_events, seal_consumers
+from index_service import index_client
+from studio_paths import StudioPathResolver
 from tg_bot_aio.bot.utils import sudo_password
 
 exclusive_lock = threading.Lock()
@@ -84,8 +85,19 @@ class EnhanceCaller:
         #     for folder in today_folders:
         #         self.add_to_ai_queue(folder)
 
+        self.queue_sealed_folders()
         self.run_ai_enhance_queue()
 
+    def queue_sealed_folders(self):
+        if 'enhance_caller' not in seal_consumers(self.config['path_settings']):
+            return
+
+        seal_queue = HourEventQueue('enhance_caller')
+        for event_file, event in seal_queue.pending(self.studio):
+            self.bound_logger.debug(f'studio "{self.studio}": sealed hour folder {event["folder_path"]}')
+            self.add_to_ai_queue(event['folder_path'])
+            seal_queue.ack(event_file)
+
     def index_ready_folders(self, ready_folders):
         for folder in ready_folders:
             try:
@@ -288,9 +300,9 @@ class EnhanceCaller:
         for hour_range in hour_ranges:
 
             try:
-                file_copier = FileCopier(self.config.get('path_settings'))
-                current_month, current_date = file_copier.get_current_month_and_date()
-                folder_path = file_copier.construct_paths(current_month, current_date, hour_range)
+                path_resolver = StudioPathResolver(self.config.get('path_settings'))
+                current_month, current_date = path_resolver.get_current_month_and_date()
+                folder_path = path_resolver.construct_paths(current_month, current_date, hour_range)
                 if folder_path not in ready_folders:
                     ready_folders.append(folder_path)
             except Exception as e:
@@ -314,9 +326,7 @@ class EnhanceCaller:
 
     @staticmethod
     def index_folder(folder_path: str):
-        path = folder_path.replace('/cloud', '')
-        command = f'sudo -u www-data php /var/www/cloud/occ files:scan -p "{path}" --shallow'
-        os.system(command)
+        return index_client.request_index(folder_path).result()
 
     def remove_from_processed_folders(self, hour_range):
         today_folders = self.get_hour_ranges_from_processed_folders()
@@ -379,6 +389,7 @@ def read_settings_file(settings_file):
 
 def run_enh_callers_for_host(host):
     bound_logger = logger.bind(host=host)
+    seal_queue = HourEventQueue('enhance_caller')
 
     while not stop_event.is_set():
         studios_settings_files = get_settings_files()
@@ -394,7 +405,7 @@ def run_enh_callers_for_host(host):
             enhance_caller = EnhanceCaller(settings=settings, ps_host=host, bound_logger=bound_logger)
             enhance_caller.run()
 
-        time.sleep(10)
+        seal_queue.wait(10)
 
 
 def send_folder_status_to_backend(
@@ -436,6 +447,8 @@ if __name__ == '__main__':
                compression='zip',
                level="DEBUG")
 
+    check_seal_events(get_settings_files())
+
     threads = []
     for host in enhancer_host_list:
         thread = threading.Thread(name=f"EnhancerThread-{host}", target=run_enh_callers_for_host, args=(host,))
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import time
+
+from os import environ
+
+from dotenv import load_dotenv
+
+load_dotenv()
+enhance_manifest_file = environ.get('ENHANCE_MANIFEST_FILE', 'enhance_manifest.db')
+# a file that failed this many times counts as settled, so its folder can still be finished
+max_attempts = 3
+
+
+class EnhanceManifest:
+    """
+    What the enhancer knows about each ready folder: source files with size, mtime and output status,
+    plus version counters for the source and the _RS folder. A cycle only lists the source folder;
+    files that are new or changed since the last cycle become pending, and chown/index run only when a
+    version moved past the one that was last indexed.
+    """
+
+    def __init__(self, manifest_path=enhance_manifest_file):
+        self.manifest_path = manifest_path
+        self.connection = sqlite3.connect(manifest_path, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS manifest_files (
+                folder TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL,
+                PRIMARY KEY (folder, name)
+            );
+            CREATE TABLE IF NOT EXISTS manifest_folders (
+                folder TEXT PRIMARY KEY,
+                source_version INTEGER NOT NULL DEFAULT 0,
+                source_indexed INTEGER NOT NULL DEFAULT -1,
+                output_version INTEGER NOT NULL DEFAULT 0,
+                output_indexed INTEGER NOT NULL DEFAULT -1,
+                updated REAL NOT NULL
+            );
+        ''')
+
+    def sync_folder(self, folder):
+        """One listing of folder against the manifest, returns True when files were added, changed or removed."""
+        output_folder = folder + '_RS'
+        known = {name: (size, mtime_ns) for name, size, mtime_ns in self.connection.execute(
+            'SELECT name, size, mtime_ns FROM manifest_files WHERE folder = ?', (folder,))}
+        now = time.time()
+        changes = []
+        found = set()
+
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                found.add(entry.name)
+                if known.get(entry.name) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                # outputs made before the manifest existed only cost one stat, on the first sight of the file
+                status = 'pending'
+                if entry.name not in known and os.path.isfile(os.path.join(output_folder, entry.name)):
+                    status = 'done'
+                changes.append((folder, entry.name, stat.st_size, stat.st_mtime_ns, status, now))
+
+        removed = [(folder, name) for name in known if name not in found]
+        if not changes and not removed and self.folder_row(folder):
+            return False
+
+        self.connection.execute('BEGIN')
+        try:
+            self.connection.executemany('INSERT OR REPLACE INTO manifest_files '
+                                        '(folder, name, size, mtime_ns, status, attempts, updated) '
+                                        'VALUES (?, ?, ?, ?, ?, 0, ?)', changes)
+            self.connection.executemany('DELETE FROM manifest_files WHERE folder = ? AND name = ?', removed)
+            self.connection.execute(
+                'INSERT INTO manifest_folders (folder, updated) VALUES (?, ?) ON CONFLICT(folder) DO UPDATE SET '
+                'source_version = source_version + 1, updated = excluded.updated', (folder, now))
+            self.connection.execute('COMMIT')
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        return True
+
+    def folder_row(self, folder):
+        return self.connection.execute(
+            'SELECT source_version, source_indexed, output_version, output_indexed FROM manifest_folders '
+            'WHERE folder = ?', (folder,)).fetchone()
+
+    def pending_files(self, folder):
+        return [name for name, in self.connection.execute(
+            "SELECT name FROM manifest_files WHERE folder = ? AND "
+            "(status = 'pending' OR (status = 'failed' AND attempts < ?)) ORDER BY name", (folder, max_attempts))]
+
+    def mark_file(self, folder, name, enhanced):
+        now = time.time()
+        if enhanced:
+            self.connection.execute("UPDATE manifest_files SET status = 'done', updated = ? "
+                                    "WHERE folder = ? AND name = ?", (now, folder, name))
+            self.connection.execute('UPDATE manifest_folders SET output_version = output_version + 1, updated = ? '
+                                    'WHERE folder = ?', (now, folder))
+        else:
+            self.connection.execute("UPDATE manifest_files SET status = 'failed', attempts = attempts + 1, "
+                                    "updated = ? WHERE folder = ? AND name = ?", (now, folder, name))
+
+    def is_complete(self, folder):
+        """Every source file is enhanced or has used up its attempts."""
+        unsettled, = self.connection.execute(
+            "SELECT COUNT(*) FROM manifest_files WHERE folder = ? AND NOT "
+            "(status = 'done' OR (status = 'failed' AND attempts >= ?))", (folder, max_attempts)).fetchone()
+        return unsettled == 0
+
+    def index_needed(self, folder, target):
+        """target is 'source' or 'output'"""
+        row = self.folder_row(folder)
+        if not row:
+            return True
+        source_version, source_indexed, output_version, output_indexed = row
+        if target == 'source':
+            return source_version != source_indexed
+        return output_version != output_indexed
+
+    def mark_indexed(self, folder, target):
+        column = 'source' if target == 'source' else 'output'
+        self.connection.execute(f'UPDATE manifest_folders SET {column}_indexed = {column}_version '
+                                f'WHERE folder = ?', (folder,))
+
+    def prune(self, max_age_days=30):
+        expired = time.time() - max_age_days * 86400
+        self.connection.execute('DELETE FROM manifest_files WHERE folder IN '
+                                '(SELECT folder FROM manifest_folders WHERE updated < ?)', (expired,))
+        self.connection.execute('DELETE FROM manifest_folders WHERE updated < ?', (expired,))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,150 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from os import environ
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+enhance_metrics_file = environ.get('ENHANCE_METRICS_FILE', 'enhance_metrics.jsonl')
+enhance_metrics_max_mb = float(environ.get('ENHANCE_METRICS_MAX_MB', 20))
+enhance_metrics_backups = int(environ.get('ENHANCE_METRICS_BACKUPS', 3))
+
+stages = ('decode', 'bw', 'enhance', 'encode')
+
+
+class EnhanceRecord:
+    """Timings, sizes and the outcome of one photo. The first failing stage names the result."""
+
+    def __init__(self, studio, item_path, engine):
+        self.data = {'time': datetime.now().isoformat(timespec='seconds'), 'studio': studio,
+                     'file': item_path, 'engine': engine, 'result': 'ok'}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.fail(name, e)
+            raise
+        finally:
+            self.data[f'{name}_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    def fail(self, stage, error):
+        if self.data['result'] == 'ok':
+            self.data.update(result=f'{stage}_error', error=type(error).__name__, message=str(error)[:300])
+
+    def set(self, **values):
+        self.data.update(values)
+
+    @property
+    def ok(self):
+        return self.data['result'] == 'ok'
+
+    def finish(self):
+        # the sum of the stages; in enhance_files the wall time would include waiting in the queues
+        self.data['total_ms'] = round(sum(self.data.get(f'{stage}_ms', 0) for stage in stages), 1)
+        return self.data
+
+
+def timed(record, stage):
+    return record.stage(stage) if record else nullcontext()
+
+
+class EnhanceMetrics:
+    """
+    One JSON line per enhanced photo in a file that rotates at max_mb, plus lifetime counters per
+    studio in <file>.summary.json. Worker processes write concurrently; a flock on <file>.lock keeps
+    rotation and the counter update of one record together.
+    """
+
+    def __init__(self, metrics_file=enhance_metrics_file, max_mb=enhance_metrics_max_mb,
+                 backups=enhance_metrics_backups):
+        self.metrics_file = metrics_file
+        self.summary_file = f'{metrics_file}.summary.json'
+        self.lock_file = f'{metrics_file}.lock'
+        self.max_bytes = max_mb * 1024 * 1024
+        self.backups = backups
+
+    @contextmanager
+    def locked(self):
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o664)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def write(self, record):
+        data = record.finish()
+        line = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            with self.locked():
+                self.rotate()
+                fd = os.open(self.metrics_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+                self.update_summary(data)
+        except Exception as e:
+            logger.error(f'Error writing enhance metrics to {self.metrics_file}: {e}')
+
+    def rotate(self):
+        try:
+            if os.path.getsize(self.metrics_file) < self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.metrics_file}.{number}'):
+                os.replace(f'{self.metrics_file}.{number}', f'{self.metrics_file}.{number + 1}')
+        if self.backups:
+            os.replace(self.metrics_file, f'{self.metrics_file}.1')
+        else:
+            os.remove(self.metrics_file)
+
+    def read_summary(self):
+        try:
+            with open(self.summary_file, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def update_summary(self, data):
+        summary = self.read_summary()
+        counters = summary.setdefault(data['studio'], {})
+        for key in ('images', f'result_{data["result"]}'):
+            counters[key] = counters.get(key, 0) + 1
+        for key in ('bytes_in', 'bytes_out', 'total_ms') + tuple(f'{stage}_ms' for stage in stages):
+            if data.get(key):
+                counters[key] = round(counters.get(key, 0) + data[key], 1)
+
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.summary_file)), suffix='.part')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, ensure_ascii=False)
+        os.replace(temp_file, self.summary_file)
+
+    def metrics_files(self):
+        """Rotated files first, so records come out oldest first."""
+        files = [f'{self.metrics_file}.{number}' for number in range(self.backups, 0, -1)]
+        return [path for path in files + [self.metrics_file] if os.path.exists(path)]
+
+    def read_records(self):
+        for path in self.metrics_files():
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+
+enhance_metrics = EnhanceMetrics()
@@ -0,0 +1,152 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+
+from os import environ
+
+from dotenv import load_dotenv
+from loguru import logger
+from PIL import Image, ImageOps
+
+from hour_events import studio_key
+from image_enhancer import ImageEnhancer, read_settings_file
+
+load_dotenv()
+enhance_preview_dir = environ.get('ENHANCE_PREVIEW_DIR', '/cloud/copy_script/enhance_preview')
+# samples are taken again from the newest hour folders once they are this old
+enhance_preview_sample_days = float(environ.get('ENHANCE_PREVIEW_SAMPLE_DAYS', 7))
+
+sample_count = 4
+sample_side = 480
+# how many source photos are looked at before the samples are picked from them
+candidate_limit = 200
+
+
+class EnhancePreview:
+    """
+    Before/after contact sheet of a studio's settings. A few photos from the studio's newest hour
+    folders are downscaled once into the preview directory, so trying new settings only runs the
+    enhancement on those small samples.
+    """
+
+    def __init__(self, settings_file, base_dir=enhance_preview_dir):
+        self.settings_file = settings_file
+        self.settings = read_settings_file(settings_file)
+        self.studio = self.settings['path_settings']['Studio_name']
+        self.photos_path = self.settings['path_settings']['BaseDirPath']
+        self.files_extension = self.settings['path_settings']['FileExtension'].lower()
+        self.studio_dir = os.path.join(base_dir, studio_key(self.studio))
+        self.samples_dir = os.path.join(self.studio_dir, 'samples')
+
+    def sample_files(self):
+        if os.path.isdir(self.samples_dir) and \
+                time.time() - os.stat(self.samples_dir).st_mtime < enhance_preview_sample_days * 86400:
+            samples = sorted(os.path.join(self.samples_dir, name) for name in os.listdir(self.samples_dir)
+                             if name.endswith('.jpg'))
+            if samples:
+                return samples
+        return self.refresh_samples()
+
+    def refresh_samples(self):
+        candidates = self.recent_photos()
+        if not candidates:
+            logger.error(f'No photos to sample for studio "{self.studio}" in {self.photos_path}')
+            return []
+
+        step = max(1, len(candidates) // sample_count)
+        picked = candidates[::step][:sample_count]
+
+        temp_dir = f'{self.samples_dir}.{os.getpid()}.part'
+        os.makedirs(temp_dir, exist_ok=True)
+        for number, photo in enumerate(picked):
+            with Image.open(photo) as image:
+                image.draft('RGB', (sample_side, sample_side))
+                image = ImageOps.exif_transpose(image).convert('RGB')
+                image.thumbnail((sample_side, sample_side))
+                image.save(os.path.join(temp_dir, f'{number}.jpg'), 'JPEG', quality=90)
+
+        shutil.rmtree(self.samples_dir, ignore_errors=True)
+        os.replace(temp_dir, self.samples_dir)
+        return sorted(os.path.join(self.samples_dir, name) for name in os.listdir(self.samples_dir))
+
+    def recent_photos(self):
+        """Source photos of the newest <month>/<dd.mm>/<hour range> folders, newest folder first."""
+        photos = []
+        for month_dir in self.newest_dirs(self.photos_path):
+            for date_dir in self.newest_dirs(month_dir):
+                for hour_dir in self.newest_dirs(date_dir):
+                    if hour_dir.endswith('_RS'):
+                        continue
+                    photos += sorted(entry.path for entry in os.scandir(hour_dir)
+                                     if entry.is_file() and entry.name.lower().endswith(self.files_extension))
+                    if len(photos) >= candidate_limit:
+                        return photos
+        return photos
+
+    @staticmethod
+    def newest_dirs(path):
+        try:
+            entries = [entry for entry in os.scandir(path) if entry.is_dir() and not entry.name.startswith('.')]
+        except OSError:
+            return []
+        return [entry.path for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime, reverse=True)]
+
+    def render(self, overrides=None, output_path=None):
+        """Contact sheet with the current settings on the left and the overridden ones on the right."""
+        samples = self.sample_files()
+        if not samples:
+            return None
+
+        current = ImageEnhancer(self.settings)
+        candidate_settings = read_settings_file(self.settings_file)
+        for key, value in (overrides or {}).items():
+            candidate_settings['image_settings'][key] = value
+        candidate = ImageEnhancer(candidate_settings)
+
+        rows = []
+        for sample in samples:
+            with Image.open(sample) as image:
+                image.load()
+            rows.append((current.enhance_preview(image) or image, candidate.enhance_preview(image) or image))
+
+        width = max(before.width for before, _ in rows)
+        sheet = Image.new('RGB', (2 * width + 8, sum(before.height + 8 for before, _ in rows) - 8), 'white')
+        top = 0
+        for before, after in rows:
+            sheet.paste(before, (0, top))
+            sheet.paste(after, (width + 8, top))
+            top += before.height + 8
+
+        output_path = output_path or os.path.join(self.studio_dir, f'preview_{time.time_ns()}.jpg')
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        sheet.save(output_path, 'JPEG', quality=85)
+        return output_path
+
+
+def parse_overrides(values):
+    overrides = {}
+    for value in values or []:
+        key, _, new_value = value.partition('=')
+        overrides[key.strip()] = new_value.strip()
+    return overrides
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Before/after preview of image enhancement settings")
+    parser.add_argument("settings_file", help="Studio config with an ImageEnhancement section")
+    parser.add_argument("--set", action='append', metavar='KEY=VALUE', help="Candidate setting, repeatable")
+    parser.add_argument("--output", help="Where to write the contact sheet")
+    parser.add_argument("--refresh", action='store_true', help="Take new samples from the newest hour folders")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='ERROR')
+    enhance_preview = EnhancePreview(args.settings_file)
+    if args.refresh:
+        enhance_preview.refresh_samples()
+    sheet_path = enhance_preview.render(parse_overrides(args.set), args.output)
+    if not sheet_path:
+        raise SystemExit(1)
+    print(sheet_path)
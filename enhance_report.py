@@ -0,0 +1,73 @@
+import argparse
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from enhance_metrics import EnhanceMetrics, enhance_metrics_file, stages
+
+
+def quantile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def load_records(metrics, studio=None, hours=None):
+    since = (datetime.now() - timedelta(hours=hours)).isoformat(timespec='seconds') if hours else ''
+    return [record for record in metrics.read_records()
+            if (not studio or record.get('studio') == studio) and record.get('time', '') >= since]
+
+
+def print_stage_table(records):
+    print(f'{"stage":<10}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}{"share":>8}')
+    totals = {stage: sum(record.get(f'{stage}_ms', 0) for record in records) for stage in stages}
+    time_total = sum(totals.values()) or 1
+    for stage in sorted(stages, key=lambda name: totals[name], reverse=True):
+        values = [record[f'{stage}_ms'] for record in records if f'{stage}_ms' in record]
+        print(f'{stage:<10}{len(values):>8}{quantile(values, 0.5):>10.0f}{quantile(values, 0.95):>10.0f}'
+              f'{max(values, default=0):>10.0f}{totals[stage] / time_total:>8.0%}')
+
+
+def print_report(records, summary, top):
+    by_studio = defaultdict(list)
+    for record in records:
+        by_studio[record.get('studio')].append(record)
+
+    for studio, studio_records in sorted(by_studio.items()):
+        results = Counter(record['result'] for record in studio_records)
+        megabytes_in = sum(record.get('bytes_in', 0) for record in studio_records) / 2 ** 20
+        megabytes_out = sum(record.get('bytes_out', 0) for record in studio_records) / 2 ** 20
+        print(f'\n== {studio}: {len(studio_records)} images, '
+              + ', '.join(f'{result} {count}' for result, count in results.most_common())
+              + f', {megabytes_in:.0f} MB in, {megabytes_out:.0f} MB out')
+        print_stage_table(studio_records)
+
+        lifetime = summary.get(studio)
+        if lifetime:
+            print('lifetime: ' + ', '.join(f'{key} {value}' for key, value in sorted(lifetime.items())))
+
+    print(f'\n== slowest {top} images')
+    for record in sorted(records, key=lambda record: record.get('total_ms', 0), reverse=True)[:top]:
+        steps = ' '.join(f'{stage}={record[f"{stage}_ms"]:.0f}' for stage in stages if f'{stage}_ms' in record)
+        print(f'{record.get("total_ms", 0):>8.0f} ms  {record.get("studio")}  {record.get("file")}  {steps}')
+
+    failures = Counter((record['result'], record.get('error', '')) for record in records if record['result'] != 'ok')
+    print('\n== failure classes')
+    if not failures:
+        print('none')
+    for (result, error), count in failures.most_common():
+        example = next(record for record in records if record['result'] == result and record.get('error', '') == error)
+        print(f'{count:>6}  {result}  {error}  e.g. {example.get("file")}: {example.get("message", "")}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Slowest steps and failure classes of the image enhancer")
+    parser.add_argument("--metrics-file", default=enhance_metrics_file)
+    parser.add_argument("--studio", help="Only this studio")
+    parser.add_argument("--hours", type=float, help="Only records of the last N hours")
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest images to list")
+    args = parser.parse_args()
+
+    metrics = EnhanceMetrics(args.metrics_file)
+    print_report(load_records(metrics, args.studio, args.hours), metrics.read_summary(), args.top)
@@ -0,0 +1,162 @@
+import os
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from os import environ
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+enhance_workers = int(environ.get('ENHANCE_WORKERS', 0)) or os.cpu_count() or 1
+# peak memory of one 24 MP photo going through decode, enhancement and encode
+enhance_job_memory_mb = int(environ.get('ENHANCE_JOB_MEMORY_MB', 600))
+
+
+def available_memory_mb():
+    try:
+        with open('/proc/meminfo', 'r') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class EnhanceJob:
+    def __init__(self, studio, folder, key, function, args, on_done=None):
+        self.studio = studio
+        self.folder = folder
+        self.key = key
+        self.function = function
+        self.args = args
+        self.on_done = on_done
+        self.queued_at = time.time()
+
+
+class EnhanceScheduler:
+    """
+    Per-file jobs from every studio on one process pool. Studios take turns, one job each, so a full
+    hour folder of one studio does not hold back the others. Jobs are only handed to the pool while
+    MemAvailable leaves room for another job of job_memory_mb.
+    """
+
+    def __init__(self, max_workers=enhance_workers, job_memory_mb=enhance_job_memory_mb, initializer=None):
+        self.max_workers = max_workers
+        self.job_memory_mb = job_memory_mb
+        self.initializer = initializer
+        self.executor = self.create_executor()
+        self.studio_queues = {}
+        self.studio_order = deque()
+        self.running = {}
+        self.tracked_keys = set()
+        self.folder_jobs = {}
+
+    def create_executor(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+
+    def submit(self, studio, folder, key, function, *args, on_done=None):
+        if key in self.tracked_keys:
+            return False
+
+        if studio not in self.studio_queues:
+            self.studio_queues[studio] = deque()
+            self.studio_order.append(studio)
+
+        self.studio_queues[studio].append(EnhanceJob(studio, folder, key, function, args, on_done))
+        self.tracked_keys.add(key)
+        self.folder_jobs[folder] = self.folder_jobs.get(folder, 0) + 1
+        return True
+
+    def is_tracked(self, key):
+        return key in self.tracked_keys
+
+    def pending_in_folder(self, folder):
+        return self.folder_jobs.get(folder, 0)
+
+    def capacity(self):
+        available_mb = available_memory_mb()
+        if available_mb is None:
+            return self.max_workers
+        return max(1, min(self.max_workers, len(self.running) + int(available_mb // self.job_memory_mb)))
+
+    def next_job(self):
+        for _ in range(len(self.studio_order)):
+            studio = self.studio_order[0]
+            self.studio_order.rotate(-1)
+            if self.studio_queues[studio]:
+                return self.studio_queues[studio].popleft()
+        return None
+
+    def dispatch(self):
+        capacity = self.capacity()
+        while len(self.running) < capacity:
+            job = self.next_job()
+            if not job:
+                break
+            try:
+                future = self.executor.submit(job.function, *job.args)
+            except BrokenProcessPool as e:
+                logger.error(f'enhance pool broken, restarting it: {e}')
+                self.studio_queues[job.studio].appendleft(job)
+                self.restart_executor()
+                break
+            self.running[future] = job
+
+    def wait(self, timeout):
+        """Waits for running jobs up to timeout seconds, returns the folders whose last job finished."""
+        self.dispatch()
+        if not self.running:
+            time.sleep(timeout)
+            return []
+
+        done, _ = wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+        finished_folders = []
+
+        for future in done:
+            job = self.running.pop(future)
+            self.forget(job)
+            # a broken pool says nothing about the file, so on_done only hears about real outcomes
+            outcome = None
+            try:
+                outcome = bool(future.result())
+            except BrokenProcessPool as e:
+                logger.error(f'enhance pool broken while processing {job.key}: {e}')
+            except Exception as e:
+                logger.error(f'studio "{job.studio}": enhance job {job.key} failed: {e}')
+                outcome = False
+
+            if job.on_done and outcome is not None:
+                try:
+                    job.on_done(outcome)
+                except Exception as e:
+                    logger.error(f'studio "{job.studio}": recording result of {job.key} failed: {e}')
+
+            if not self.folder_jobs.get(job.folder):
+                finished_folders.append(job.folder)
+
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+            self.restart_executor()
+
+        self.dispatch()
+        return finished_folders
+
+    def forget(self, job):
+        self.tracked_keys.discard(job.key)
+        self.folder_jobs[job.folder] -= 1
+        if not self.folder_jobs[job.folder]:
+            del self.folder_jobs[job.folder]
+
+    def restart_executor(self):
+        # jobs that were running are forgotten, their files are picked up again on the next scan
+        for job in self.running.values():
+            self.forget(job)
+        self.running = {}
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.create_executor()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
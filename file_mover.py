@@ -0,0 +1,199 @@
+import argparse
+import errno
+import os
+import shutil
+import tempfile
+import time
+
+from collections import Counter
+
+from loguru import logger
+
+fallback_errors = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+
+class FileMover:
+    """
+    os.rename when source and destination are on the same device, otherwise an in-kernel copy
+    (copy_file_range, then sendfile) to a temporary name. Copied files are fsynced and their sources
+    removed in flush(), with one directory fsync per destination directory.
+    """
+
+    # temporary copies are made next to the hour folder, so nothing that lists the hour folder sees them
+    staging_name = '.ingest_staging'
+
+    def __init__(self):
+        self.pending_copies = []
+        self.method_counts = Counter()
+        self.bytes_moved = 0
+
+    def move(self, source_file, destination_file):
+        source_stat = os.stat(source_file)
+        destination_dir = os.path.dirname(destination_file)
+        destination_dev = os.stat(destination_dir).st_dev
+
+        if source_stat.st_dev == destination_dev:
+            os.rename(source_file, destination_file)
+            self.method_counts['rename'] += 1
+        else:
+            staging_dir = self.staging_dir(destination_dir, destination_dev)
+            temp_file = os.path.join(staging_dir, f'.{os.path.basename(destination_file)}.part')
+            try:
+                self.method_counts[self.copy_file(source_file, temp_file)] += 1
+                shutil.copystat(source_file, temp_file)
+                os.rename(temp_file, destination_file)
+            except Exception:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+            finally:
+                if staging_dir != destination_dir:
+                    try:
+                        os.rmdir(staging_dir)
+                    except OSError:
+                        pass
+            self.pending_copies.append((source_file, destination_file))
+
+        self.bytes_moved += source_stat.st_size
+
+    def staging_dir(self, destination_dir, destination_dev):
+        staging_dir = os.path.join(os.path.dirname(destination_dir), self.staging_name)
+        try:
+            os.makedirs(staging_dir, exist_ok=True)
+            # the final rename has to stay on one device
+            if os.stat(staging_dir).st_dev == destination_dev:
+                return staging_dir
+        except OSError as e:
+            logger.warning(f"Cannot use staging folder '{staging_dir}': {e}")
+        return destination_dir
+
+    @staticmethod
+    def copy_file(source_file, destination_file):
+        with open(source_file, 'rb') as source, open(destination_file, 'wb') as destination:
+            source_fd, destination_fd = source.fileno(), destination.fileno()
+            size = os.fstat(source_fd).st_size
+            copied = 0
+
+            for method in ('copy_file_range', 'sendfile'):
+                try:
+                    while copied < size:
+                        if method == 'copy_file_range':
+                            chunk = os.copy_file_range(source_fd, destination_fd, size - copied,
+                                                       offset_src=copied, offset_dst=copied)
+                        else:
+                            os.lseek(destination_fd, copied, os.SEEK_SET)
+                            chunk = os.sendfile(destination_fd, source_fd, copied, size - copied)
+                        if chunk == 0:
+                            break
+                        copied += chunk
+                except (OSError, AttributeError) as e:
+                    if copied or (isinstance(e, OSError) and e.errno not in fallback_errors):
+                        raise
+                    continue
+
+                if copied == size:
+                    return method
+                if copied:
+                    raise OSError(errno.EIO, f'short copy of {source_file}: {copied} of {size} bytes')
+
+            shutil.copyfileobj(source, destination, 1024 * 1024)
+            destination.flush()
+            copied = os.fstat(destination_fd).st_size
+            if copied != size:
+                raise OSError(errno.EIO, f'short copy of {source_file}: {copied} of {size} bytes')
+            return 'copyfileobj'
+
+    def is_pending(self, source_file):
+        """The source of a copy that is not fsynced yet, it must not be ingested a second time."""
+        return any(pending_source == source_file for pending_source, _ in self.pending_copies)
+
+    def flush(self):
+        """
+        Copies whose file or directory fsync fails stay pending for the next flush, with their sources
+        kept. A copy whose destination disappeared is dropped, so its source is ingested again.
+        """
+        if not self.pending_copies:
+            return
+
+        synced, failed = [], []
+        for source_file, destination_file in self.pending_copies:
+            try:
+                fd = os.open(destination_file, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                synced.append((source_file, destination_file))
+            except FileNotFoundError:
+                logger.error(f"Copied file '{destination_file}' disappeared before fsync, "
+                             f"keeping source '{source_file}'")
+            except Exception as e:
+                logger.error(f"Error syncing copied file '{destination_file}': {e}")
+                failed.append((source_file, destination_file))
+
+        failed_directories = set()
+        for directory in {os.path.dirname(destination_file) for _, destination_file in synced}:
+            try:
+                fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except Exception as e:
+                logger.error(f"Error syncing folder '{directory}': {e}")
+                failed_directories.add(directory)
+
+        for source_file, destination_file in synced:
+            if os.path.dirname(destination_file) in failed_directories:
+                failed.append((source_file, destination_file))
+                continue
+            try:
+                os.remove(source_file)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error removing source file '{source_file}' after copy: {e}")
+                failed.append((source_file, destination_file))
+
+        self.pending_copies = failed
+
+
+def run_benchmark(source_dir, destination_dir, files_count, file_size_mb):
+    mover = FileMover()
+    work_source = tempfile.mkdtemp(prefix='mover_bench_', dir=source_dir)
+    work_destination = tempfile.mkdtemp(prefix='mover_bench_', dir=destination_dir)
+    chunk = os.urandom(1024 * 1024)
+
+    try:
+        for index in range(files_count):
+            with open(os.path.join(work_source, f'bench_{index}.jpg'), 'wb') as file:
+                for _ in range(file_size_mb):
+                    file.write(chunk)
+                os.fsync(file.fileno())
+
+        started = time.perf_counter()
+        for index in range(files_count):
+            mover.move(os.path.join(work_source, f'bench_{index}.jpg'),
+                       os.path.join(work_destination, f'bench_{index}.jpg'))
+        mover.flush()
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_source, ignore_errors=True)
+        shutil.rmtree(work_destination, ignore_errors=True)
+
+    megabytes = mover.bytes_moved / (1024 * 1024)
+    print(f'{source_dir} -> {destination_dir}')
+    print(f'files: {files_count}, size: {megabytes:.1f} MB, time: {elapsed:.3f} s, '
+          f'throughput: {megabytes / elapsed:.1f} MB/s')
+    print(f'methods: {dict(mover.method_counts)}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="File mover benchmark")
+    parser.add_argument("--benchmark", nargs=2, metavar=("SOURCE_DIR", "DESTINATION_DIR"), required=True,
+                        help="Directories on the mounts to compare, e.g. the camera share and /cloud")
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=10)
+    args = parser.parse_args()
+
+    run_benchmark(args.benchmark[0], args.benchmark[1], args.files, args.size_mb)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import time
+
+from configparser import ConfigParser
+from os import environ
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from inotify_watcher import InotifyWatcher, InotifyUnavailable, IN_MOVED_TO
+
+load_dotenv()
+hour_events_dir = environ.get('HOUR_EVENTS_DIR', '/cloud/copy_script/hour_events')
+seal_event_consumers = ('image_enhancer', 'enhance_caller')
+
+
+def studio_key(studio_name):
+    return hashlib.blake2b(studio_name.encode(), digest_size=4).hexdigest()
+
+
+def seal_consumers(settings):
+    """Consumers named in SealEvents of a studio's [Settings]; the copier and both enhancers read it here."""
+    return [consumer.strip() for consumer in settings.get('SealEvents', '').split(',')
+            if consumer.strip() in seal_event_consumers]
+
+
+def check_seal_events(settings_files):
+    """
+    Warns about SealEvents entries that no consumer would pick up, because the name is unknown or the
+    studio's [ImageEnhancement] sends it to the other enhancer. Their events would pile up in the spool.
+    """
+    for settings_file in settings_files:
+        try:
+            config = ConfigParser()
+            with open(settings_file, 'r', encoding='utf-8') as file:
+                config.read_file(file)
+            settings = config['Settings']
+        except Exception as e:
+            logger.error(f'Error reading SealEvents from {settings_file}: {e}')
+            continue
+
+        enhancement = config['ImageEnhancement'] if config.has_section('ImageEnhancement') else {}
+        ai_enhancer = enhancement.get('enhancer') in ('ai_enhancer', 'ai_enhancer_bot_only')
+        for consumer in (name.strip() for name in settings.get('SealEvents', '').split(',')):
+            if not consumer:
+                continue
+            if consumer not in seal_event_consumers:
+                problem = f'is unknown, expected one of {", ".join(seal_event_consumers)}'
+            elif consumer == 'image_enhancer' and (not enhancement or ai_enhancer):
+                problem = 'is set, but the studio is not enhanced by image_enhancer'
+            elif consumer == 'enhance_caller' and not (enhancement.get('action') and enhancement.get('api_url')):
+                problem = 'is set, but the studio has no enhance_caller action and api_url'
+            else:
+                continue
+            logger.warning(f'SealEvents consumer "{consumer}" in {settings_file} {problem}')
+
+
+class HourEventQueue:
+    """
+    Spool directory per consumer. Every event is a JSON file renamed into place, so a reader never
+    sees a partial event and events survive restarts until they are acknowledged. File names start
+    with a hash of the studio name, so several studios can share one consumer directory.
+    """
+
+    def __init__(self, consumer, spool_dir=hour_events_dir):
+        self.path = os.path.join(spool_dir, consumer)
+        os.makedirs(self.path, exist_ok=True)
+        self.watcher = None
+
+    def publish(self, event):
+        event_name = f'{studio_key(event["studio"])}_{time.time_ns()}.json'
+        temp_file = os.path.join(self.path, f'.{event_name}.part')
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(event, file, ensure_ascii=False)
+        os.rename(temp_file, os.path.join(self.path, event_name))
+
+    def pending(self, studio_name):
+        prefix = f'{studio_key(studio_name)}_'
+        events = []
+        for event_name in sorted(os.listdir(self.path)):
+            if not (event_name.startswith(prefix) and event_name.endswith('.json')):
+                continue
+            event_file = os.path.join(self.path, event_name)
+            try:
+                with open(event_file, 'r', encoding='utf-8') as file:
+                    events.append((event_file, json.load(file)))
+            except FileNotFoundError:
+                continue
+            except json.JSONDecodeError as e:
+                logger.error(f'Dropping broken hour event {event_file}: {e}')
+                self.ack(event_file)
+        return events
+
+    @staticmethod
+    def ack(event_file):
+        try:
+            os.remove(event_file)
+        except FileNotFoundError:
+            pass
+
+    def wait(self, timeout):
+        """Sleeps up to timeout seconds, returning early when an event is published."""
+        if not self.watcher:
+            try:
+                self.watcher = InotifyWatcher(self.path, IN_MOVED_TO)
+            except InotifyUnavailable as e:
+                logger.warning(f'inotify unavailable for {self.path}, polling: {e}')
+                self.watcher = False
+
+        if self.watcher:
+            return bool(self.watcher.read_events(timeout=timeout))
+
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        if self.watcher:
+            self.watcher.close()
+        self.watcher = None
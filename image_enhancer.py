@@ -1,17 +1,37 @@
+import hashlib
 import os
-import multiprocessing
+import queue
 import setproctitle
+import struct
+import threading
 import time
 
 import pytz
+from functools import partial
 import json
 from datetime import datetime
 from loguru import logger
 
 from PIL import Image, ImageEnhance, ImageOps, ExifTags, ImageFilter
 from configparser import ConfigParser, NoSectionError
+from enhance_manifest import EnhanceManifest
+from enhance_metrics import EnhanceRecord, enhance_metrics, timed
+from enhance_scheduler import EnhanceScheduler
+from hour_events import HourEventQueue, check_seal_events, seal_consumers
+from index_service import index_client
+from numpy_enhancer import NumpyEnhancer
 from tg_bot import TelegramBot
-from photos_copy_script import FileCopier, read_config
+from studio_paths import StudioPathResolver
+
+# photos waiting between the stages of enhance_files; each one is a full decoded image
+pipeline_queue_size = 2
+# studio -> (hash of the point-wise settings, {black_white: (tone LUT, brightness LUT)}); a changed config
+# replaces the studio's entry
+tone_lut_cache = {}
+
+
+def float32(value):
+    return struct.unpack('f', struct.pack('f', value))[0]
 
 
 class ImageEnhancer:
@@ -31,52 +51,97 @@ class ImageEnhancer:
         self.quality = int(settings['image_settings']['Quality'])
         self.studio_timezone = pytz.timezone(settings['path_settings']['TimeZoneName'])
         self.settings = settings
+        self.tone_settings_hash = hashlib.blake2b(
+            repr((self.temperature, self.brightness_value, self.bw_brightness_value)).encode(),
+            digest_size=8).hexdigest()
+        self.tile_memory_budget_mb = float(settings['image_settings'].get('TileMemoryBudgetMB', 0))
+        self.numpy_enhancer = None
+        if settings['image_settings'].get('Engine', 'pil').lower() == 'numpy':
+            try:
+                self.numpy_enhancer = NumpyEnhancer(self)
+            except ImportError as e:
+                logger.error(f'numpy engine unavailable, using PIL: {e}')
+        if self.tile_memory_budget_mb and not self.numpy_enhancer:
+            logger.warning('TileMemoryBudgetMB only applies to Engine = numpy, processing whole images')
 
     def enhance_image(self, im, black_white=None):
+        # temperature comes from the tone LUT before this, see apply_tone_lut
         if im.mode != 'RGB':
             im = im.convert('RGB')
 
         enhancer = ImageEnhance.Sharpness(im)
         im = enhancer.enhance(self.sharpness)
         if black_white:
-            enhancer = ImageEnhance.Brightness(im)
-            im = enhancer.enhance(self.bw_brightness_value)
+            im = self.apply_brightness_lut(im, black_white=True)
             enhancer = ImageEnhance.Contrast(im)
             im = enhancer.enhance(self.bw_contrast_value)
         else:
             enhancer = ImageEnhance.Color(im)
             im = enhancer.enhance(self.color_saturation_value)
-            enhancer = ImageEnhance.Brightness(im)
-            im = enhancer.enhance(self.brightness_value)
+            im = self.apply_brightness_lut(im)
             enhancer = ImageEnhance.Contrast(im)
             im = enhancer.enhance(self.contrast_value)
 
         return im
 
-    def adjust_image_temperature(self, image):
-
+    def tone_lut(self, black_white=False):
+        return self.cached_luts()[black_white][0]
+
+    def brightness_lut(self, black_white=False):
+        return self.cached_luts()[black_white][1]
+
+    def cached_luts(self):
+        cached = tone_lut_cache.get(self.studio)
+        if not cached or cached[0] != self.tone_settings_hash:
+            cached = (self.tone_settings_hash, {black_white: (self.build_tone_lut(black_white),
+                                                              self.build_brightness_lut(black_white))
+                                                for black_white in (False, True)})
+            tone_lut_cache[self.studio] = cached
+        return cached[1]
+
+    def build_tone_lut(self, black_white):
+        """
+        R, G and B tables for one Image.point call with the temperature shift of red and blue, rounded the
+        way point() rounds a lambda. Black and white photos are not shifted, so they get None.
+        """
+        if black_white or not self.temperature:
+            return None
+
+        lut = []
+        for shift in (self.temperature, 0, -self.temperature):
+            lut += [round(min(255, max(0, value + shift))) for value in range(256)]
+        return lut
+
+    def build_brightness_lut(self, black_white):
+        """
+        ImageEnhance.Brightness as a table. Its blend with black multiplies in C floats and truncates, so
+        the factor and the product are rounded to float32 before int().
+        """
+        brightness = float32(self.bw_brightness_value if black_white else self.brightness_value)
+        lut = [min(255, int(float32(value * brightness))) for value in range(256)]
+        return None if lut == list(range(256)) else lut * 3
+
+    def apply_tone_lut(self, image, black_white=False):
         if image.mode != 'RGB':
             image = image.convert('RGB')
-        r, g, b = image.split()
+        lut = self.tone_lut(black_white)
+        return image.point(lut) if lut else image
 
-        if self.temperature < 0:  # cool down
-            r = r.point(lambda i: max(0, i + self.temperature))
-            b = b.point(lambda i: min(255, i - self.temperature))
-        else:  # warm up
-            r = r.point(lambda i: min(255, i + self.temperature))
-            b = b.point(lambda i: max(0, i - self.temperature))
-
-        return Image.merge('RGB', (r, g, b))
+    def apply_brightness_lut(self, image, black_white=False):
+        lut = self.brightness_lut(black_white)
+        return image.point(lut) if lut else image
 
     @staticmethod
     def is_black_white(image):
+        # single band (and palette) images have at most 256 colours once converted to RGB
+        if image.mode in ('1', 'L', 'LA', 'P', 'PA', 'I', 'I;16', 'F'):
+            return True
 
         if image.mode != 'RGB':
             image = image.convert('RGB')
 
-        colors = set(image.getdata())
-
-        return True if len(colors) < 600 else False
+        # fewer than 600 colours; getcolors gives up as soon as it counts more than 599
+        return image.getcolors(599) is not None
 
     def enhance_folder(self, folder):
         if not os.path.exists(folder):
@@ -84,51 +149,166 @@ class ImageEnhancer:
             # logger.info(f'Hour range {folder.split('/')[-1]} of folder {folder} removed from processed folders')
             return
         logger.debug(f'enhance folder: {folder}')
+        self.enhance_files(self.files_to_enhance(folder))
+
+        return folder + '_RS'
+
+    @staticmethod
+    def files_to_enhance(folder):
         new_folder = folder + '_RS'
         if not os.path.exists(new_folder):
             os.mkdir(new_folder)
+
+        files = []
         for item in os.listdir(folder):
             if os.path.isfile(os.path.join(new_folder, item)):
                 continue
             item_path = os.path.join(folder, item)
             if os.path.isfile(item_path):
-                try:
-                    with open(item_path, 'rb') as f:
-                        image = Image.open(f)
-
-                        original_exif = image.info.get('exif', b'')
-                        logger.debug(f'enhancing file: {item_path}')
-
-                        black_white = self.is_black_white(image)
-                        if not black_white:
-                            try:
-                                image = self.adjust_image_temperature(image)
-                            except Exception as e:
-                                logger.error(f'Error adjusting image "{item}" temperature: {e}')
-                        try:
-                            enhanced_image_content = self.enhance_image(image, black_white=black_white)
-                        except Exception as e:
-                            logger.error(f'Error enhancing image "{item}": {e}')
-                        try:
-                            self.save_image(enhanced_image_content, item_path.replace(folder, new_folder),
-                                            original_exif)
-                        except Exception as e:
-                            logger.error(f'Error saving enhanced image "{item}": {e}')
-                except Exception as e:
-                    logger.error(f'Error processing file "{item_path}": {e}')
+                files.append((item_path, os.path.join(new_folder, item)))
             else:
                 logger.error(f'not a file: {item_path}')
+        return files
+
+    def enhance_files(self, files):
+        """
+        Reader thread -> enhancement in the calling thread -> writer thread, joined by bounded queues.
+        PIL releases the GIL while decoding and encoding, so the next photo is read and the previous one
+        written while the current one is enhanced. Only enhance_folder uses it; the scheduler's pool
+        already keeps every core busy with one enhance_file_job per photo.
+        """
+        read_queue = queue.Queue(maxsize=pipeline_queue_size)
+        write_queue = queue.Queue(maxsize=pipeline_queue_size)
+        stop = threading.Event()
+
+        def put(task_queue, task):
+            # once the pipeline stops nobody takes tasks any more, so a full queue must not block forever
+            while not stop.is_set():
+                try:
+                    task_queue.put(task, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_files():
+            try:
+                for item_path, output_path in files:
+                    if stop.is_set():
+                        return
+                    record = self.create_record(item_path)
+                    try:
+                        image, original_exif = self.read_image(item_path, record)
+                    except Exception as e:
+                        logger.error(f'Error processing file "{item_path}": {e}')
+                        enhance_metrics.write(record)
+                        continue
+                    if not put(read_queue, (image, original_exif, item_path, output_path, record)):
+                        return
+            finally:
+                put(read_queue, None)
+
+        def write_files():
+            while True:
+                task = write_queue.get()
+                if task is None:
+                    break
+                enhanced_image, output_path, original_exif, record = task
+                try:
+                    self.write_image(enhanced_image, output_path, original_exif, record)
+                    enhance_metrics.write(record)
+                except Exception as e:
+                    logger.error(f'Error writing enhanced image "{output_path}": {e}')
+
+        reader = threading.Thread(target=read_files, name='enhance_reader', daemon=True)
+        writer = threading.Thread(target=write_files, name='enhance_writer', daemon=True)
+        reader.start()
+        writer.start()
+        try:
+            while True:
+                task = read_queue.get()
+                if task is None:
+                    break
+                image, original_exif, item_path, output_path, record = task
+                enhanced_image = self.process_image(image, os.path.basename(item_path), record)
+                if enhanced_image is None:
+                    enhance_metrics.write(record)
+                    continue
+                write_queue.put((enhanced_image, output_path, original_exif, record))
+        finally:
+            # after an error the reader stops at its next file; what it has read already is dropped and
+            # stays pending, the writer finishes the photos handed to it and then exits
+            stop.set()
+            reader.join()
+            while not read_queue.empty():
+                read_queue.get_nowait()
+            write_queue.put(None)
+            writer.join()
+
+    def enhance_file(self, item_path, output_path):
+        record = self.create_record(item_path)
+        try:
+            image, original_exif = self.read_image(item_path, record)
+        except Exception as e:
+            logger.error(f'Error processing file "{item_path}": {e}')
+            enhance_metrics.write(record)
+            return False
+
+        enhanced_image = self.process_image(image, os.path.basename(item_path), record)
+        if enhanced_image is not None:
+            self.write_image(enhanced_image, output_path, original_exif, record)
+        enhance_metrics.write(record)
+        return record.ok
 
-        return new_folder
+    def create_record(self, item_path):
+        return EnhanceRecord(self.studio, item_path, 'numpy' if self.numpy_enhancer else 'pil')
 
     @staticmethod
-    def check_full_folder(folder_path):
-        num_source_files = len([f for f in os.listdir(folder_path)
-                                if os.path.isfile(os.path.join(folder_path, f))])
-        num_enhanced_files = len([f for f in os.listdir(folder_path + '_RS')
-                                if os.path.isfile(os.path.join(folder_path + '_RS', f))])
-        if num_enhanced_files >= num_source_files:
-            return True
+    def read_image(item_path, record=None):
+        logger.debug(f'enhancing file: {item_path}')
+        with timed(record, 'decode'):
+            with open(item_path, 'rb') as f:
+                image = Image.open(f)
+                image.load()
+        if record:
+            record.set(bytes_in=os.path.getsize(item_path), width=image.width, height=image.height)
+        return image, image.info.get('exif', b'')
+
+    def process_image(self, image, item, record=None):
+        try:
+            with timed(record, 'bw'):
+                black_white = self.is_black_white(image)
+        except Exception as e:
+            logger.error(f'Error detecting black and white image "{item}": {e}')
+            return None
+        if record:
+            record.set(black_white=black_white)
+
+        try:
+            with timed(record, 'enhance'):
+                if self.numpy_enhancer:
+                    return self.numpy_enhancer.enhance(image, black_white=black_white)
+                try:
+                    image = self.apply_tone_lut(image, black_white=black_white)
+                except Exception as e:
+                    logger.error(f'Error adjusting image "{item}" tone: {e}')
+                    if record:
+                        record.set(tone_error=type(e).__name__)
+                return self.enhance_image(image, black_white=black_white)
+        except Exception as e:
+            logger.error(f'Error enhancing image "{item}": {e}')
+            return None
+
+    def write_image(self, enhanced_image, output_path, original_exif, record=None):
+        try:
+            with timed(record, 'encode'):
+                self.save_image(enhanced_image, output_path, original_exif)
+        except Exception as e:
+            logger.error(f'Error saving enhanced image "{os.path.basename(output_path)}": {e}')
+            return False
+        if record:
+            record.set(bytes_out=os.path.getsize(output_path))
+        return True
 
     @staticmethod
     def chown_folder(folder_path):
@@ -137,48 +317,64 @@ class ImageEnhancer:
 
     @staticmethod
     def index_folder(folder_path):
-        path = folder_path.replace('/cloud', '')
-        command = f'sudo -u www-data php /var/www/cloud/occ files:scan -p "{path}" --shallow'
-        os.system(command)
+        return index_client.request_index(folder_path)
 
-    def save_image(self, im, file_path, original_exif):
+    def apply_filters(self, im):
         if self.sharp_filter:
             logger.debug("sharp filter enabled")
-            im = im.filter(ImageFilter.SHARPEN)
+            # the numpy engine has already applied SHARPEN as part of its convolution
+            if not self.numpy_enhancer:
+                im = im.filter(ImageFilter.SHARPEN)
         elif self.blur_filter:
             logger.debug("blur filter enabled")
             im = im.filter(ImageFilter.GaussianBlur(1.3))
-        im.save(file_path, dpi=(300, 300), quality=self.quality, exif=original_exif, subsampling=0)
+        return im
+
+    def enhance_preview(self, image):
+        """Everything enhance_file does to a photo, in memory; meant for small samples."""
+        enhanced_image = self.process_image(image, 'preview')
+        if enhanced_image is None:
+            return None
+        return self.apply_filters(enhanced_image)
+
+    def save_image(self, im, file_path, original_exif):
+        im = self.apply_filters(im)
+
+        # written under a temporary name and renamed, so a crash never leaves a truncated photo in _RS
+        temp_path = os.path.join(os.path.dirname(file_path), f'.{os.path.basename(file_path)}.part')
+        image_format = Image.registered_extensions().get(os.path.splitext(file_path)[1].lower(), 'JPEG')
+        try:
+            im.save(temp_path, format=image_format, dpi=(300, 300), quality=self.quality,
+                    exif=original_exif, subsampling=0)
+            os.replace(temp_path, file_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
         logger.debug(f'saved file:{file_path}')
 
-    def run(self):
+    def folders_to_enhance(self, sealed_folders=()):
         if not os.path.exists(self.photos_path):
             logger.error(f'Folder {self.photos_path} does not exist')
-            return
+            return []
         today_folders = self.get_ready_folders_list()
+        today_folders += [folder for folder in sealed_folders if folder not in today_folders]
         logger.debug(f'folders to enhance: {today_folders}')
-        if not today_folders:
-            return
+        return today_folders
 
-        self.index_ready_folders(today_folders)
+    def finish_folder(self, folder, new_folder, folder_is_full, index_output):
+        logger.info(f'folder {folder} is_full: {folder_is_full}')
+        logger.info(f'new_folder: {new_folder}')
 
-        for folder in today_folders:
-            try:
-                new_folder = self.enhance_folder(folder)
-                folder_is_full = self.check_full_folder(folder)
-
-                logger.info(f'folder {folder} is_full: {folder_is_full}')
-                logger.info(f'new_folder: {new_folder}')
-
-                if not (new_folder and folder_is_full):
-                    continue
-                self.chown_folder(new_folder)
-                self.index_folder(new_folder)
-                self.remove_from_processed_folders(folder.split('/')[-1])
-
-            except Exception as e:
-                logger.error(f'enhance folder {folder} error: {e}')
+        if not (new_folder and folder_is_full):
+            return False
+        if index_output:
+            self.chown_folder(new_folder)
+            self.index_folder(new_folder)
+        if folder.split('/')[-1] in (self.get_hour_ranges_from_processed_folders() or []):
+            self.remove_from_processed_folders(folder.split('/')[-1])
+        return True
 
     def index_ready_folders(self, ready_folders):
         for folder in ready_folders:
@@ -192,15 +388,15 @@ class ImageEnhancer:
 
         ready_folders = []
 
-        hour_ranges = self.get_hour_ranges_from_processed_folders()
+        hour_ranges = self.get_hour_ranges_from_processed_folders() or []
 
         for hour_range in hour_ranges:
             try:
                 config = self.settings['path_settings']
                 logger.debug(f'studio: {config["Studio_name"]}')
-                file_copier = FileCopier(config)
-                current_month, current_date = file_copier.get_current_month_and_date()
-                folder_path = file_copier.construct_paths(current_month, current_date, hour_range)
+                path_resolver = StudioPathResolver(config)
+                current_month, current_date = path_resolver.get_current_month_and_date()
+                folder_path = path_resolver.construct_paths(current_month, current_date, hour_range)
 
                 logger.debug(f'folder path: {folder_path}')
                 if folder_path not in ready_folders:
@@ -244,56 +440,132 @@ def read_settings_file(settings_file):
             return {'path_settings': path_settings}
 
 
-def run_image_enhancer(studio_settings_file: str):
-    error_sent = False
+worker_enhancers = {}
+
+
+def get_worker_enhancer(settings_file):
+    # every pool worker keeps one ImageEnhancer per studio and rebuilds it when the config changes
+    settings_mtime = os.stat(settings_file).st_mtime_ns
+    cached = worker_enhancers.get(settings_file)
+    if not cached or cached[0] != settings_mtime:
+        cached = (settings_mtime, ImageEnhancer(read_settings_file(settings_file)))
+        worker_enhancers[settings_file] = cached
+    return cached[1]
+
+
+def enhance_file_job(settings_file, item_path, output_path):
+    image_enhancer = get_worker_enhancer(settings_file)
+    with logger.contextualize(studio=image_enhancer.studio):
+        return image_enhancer.enhance_file(item_path, output_path)
 
-    studio_name = (read_settings_file(studio_settings_file)
-                   .get('path_settings').get('studio_name'))
 
+def init_enhance_worker():
+    setproctitle.setproctitle('image_enhancer_worker')
+
+
+def add_studio_log(studio_name):
     logger.add(f"{studio_name}_image_enhancer.log",
                format="{time} {level} {message}",
                rotation="1 MB",
                compression='zip',
-               level="DEBUG")
+               level="DEBUG",
+               filter=lambda record: record["extra"].get("studio") == studio_name,
+               enqueue=True)
 
-    while True:
-        studio_settings = read_settings_file(studio_settings_file)
-        path_settings = studio_settings.get('path_settings')
-        studio_name = path_settings.get('studio_name')
-        logger.info(f"Starting {studio_name} image enhancer, time: {datetime.now().strftime('%H:%M:%S')}")
 
+def schedule_studio_files(scheduler, settings_file, seal_queue, manifest):
+    studio_settings = read_settings_file(settings_file)
+    image_enhancer = ImageEnhancer(studio_settings)
+    studio_name = image_enhancer.studio
+
+    sealed_events = []
+    if 'image_enhancer' in seal_consumers(studio_settings['path_settings']):
+        sealed_events = seal_queue.pending(studio_name)
+
+    finished_folders = []
+    for folder in image_enhancer.folders_to_enhance([event['folder_path'] for _, event in sealed_events]):
         try:
-            image_enhancer = ImageEnhancer(studio_settings)
-            process_name = f"{studio_name}_image_enhancer"
-            setproctitle.setproctitle(process_name)
-            image_enhancer.run()
-            time.sleep(15)
-            error_sent = False
-        except Exception as e:
-            logger.error(f"Error run_image_enhancer: {e}")
-            # if not error_sent:
-            #     tg_bot = TelegramBot()
-            #     tg_bot.send_message_to_group(f"Error in {studio_name} image enhancer: {e}")
-            #     error_sent = True
-            time.sleep(15)
+            if not os.path.exists(folder):
+                finished_folders.append(folder)
+                continue
 
+            new_folder = folder + '_RS'
+            if not os.path.exists(new_folder):
+                os.mkdir(new_folder)
 
-if __name__ == '__main__':
-    studios_as_args = []
-    studios_settings_files = get_settings_files()
-    for settings_file in studios_settings_files:
-        settings = read_settings_file(settings_file)
-        if (settings.get('image_settings') and
-                settings.get('image_settings').get('enhancer') not in ['ai_enhancer', 'ai_enhancer_bot_only']):
-            studios_as_args.append(settings_file)
-    with multiprocessing.Pool() as pool:
-        pool.starmap(run_image_enhancer, [(arg,) for arg in studios_as_args])
+            # only new or changed files become pending, and the folders are indexed only after a change
+            manifest.sync_folder(folder)
+            if manifest.index_needed(folder, 'source'):
+                image_enhancer.index_ready_folders([folder])
+                manifest.mark_indexed(folder, 'source')
 
+            for item in manifest.pending_files(folder):
+                output_path = os.path.join(new_folder, item)
+                scheduler.submit(studio_name, folder, output_path,
+                                 enhance_file_job, settings_file, os.path.join(folder, item), output_path,
+                                 on_done=partial(manifest.mark_file, folder, item))
 
+            if scheduler.pending_in_folder(folder):
+                continue
+            index_output = manifest.index_needed(folder, 'output')
+            if image_enhancer.finish_folder(folder, new_folder, manifest.is_complete(folder), index_output):
+                if index_output:
+                    manifest.mark_indexed(folder, 'output')
+                finished_folders.append(folder)
 
+        except Exception as e:
+            logger.error(f'enhance folder {folder} error: {e}')
 
+    for event_file, event in sealed_events:
+        if event['folder_path'] in finished_folders:
+            seal_queue.ack(event_file)
 
 
+def run_enhance_scheduler():
+    setproctitle.setproctitle('image_enhancer')
+    scheduler = EnhanceScheduler(initializer=init_enhance_worker)
+    seal_queue = HourEventQueue('image_enhancer')
+    manifest = EnhanceManifest()
+    logged_studios = set()
+    next_scan = 0
+    next_prune = 0
 
+    logger.info(f'image enhancer scheduler started, workers: {scheduler.max_workers}')
+    check_seal_events(get_settings_files())
 
+    while True:
+        if time.time() >= next_scan:
+            for settings_file in get_settings_files():
+                try:
+                    settings = read_settings_file(settings_file)
+                    if (not settings.get('image_settings') or
+                            settings.get('image_settings').get('enhancer') in ['ai_enhancer', 'ai_enhancer_bot_only']):
+                        continue
+
+                    studio_name = settings.get('path_settings').get('studio_name')
+                    if studio_name not in logged_studios:
+                        add_studio_log(studio_name)
+                        logged_studios.add(studio_name)
+
+                    with logger.contextualize(studio=studio_name):
+                        logger.info(f"Starting {studio_name} image enhancer, "
+                                    f"time: {datetime.now().strftime('%H:%M:%S')}")
+                        schedule_studio_files(scheduler, settings_file, seal_queue, manifest)
+                except Exception as e:
+                    logger.error(f"Error run_image_enhancer: {e}")
+            next_scan = time.time() + 15
 
+        if time.time() >= next_prune:
+            try:
+                manifest.prune()
+            except Exception as e:
+                logger.error(f'Error pruning enhance manifest: {e}')
+            next_prune = time.time() + 3600
+
+        # a folder whose last file is done or a sealed hour folder triggers the next scan right away
+        if scheduler.wait(timeout=1) or seal_queue.wait(0):
+            next_scan = 0
+
+
+if __name__ == '__main__':
+    run_enhance_scheduler()
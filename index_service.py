@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import json
+import os
+import signal
+import socket
+import subprocess
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import environ
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+index_socket_path = environ.get('INDEX_SERVICE_SOCKET', '/cloud/copy_script/index_service.sock')
+debounce_seconds = float(environ.get('INDEX_DEBOUNCE_SECONDS', 1.0))
+max_parallel_scans = int(environ.get('INDEX_MAX_PARALLEL_SCANS', 2))
+client_timeout = float(environ.get('INDEX_CLIENT_TIMEOUT', 900))
+# distinct paths waiting for a client thread; past this, requests are dropped instead of piling up
+client_max_queued = int(environ.get('INDEX_CLIENT_MAX_QUEUED', 64))
+sudo_password = environ.get('SUDOP')
+
+# -S reads the password from stdin, so the scan also runs without a tty
+occ_scan_command = ['sudo', '-S', '-u', 'www-data', 'php', '/var/www/cloud/occ', 'files:scan']
+
+
+def normalize_index_path(path):
+    path = os.path.normpath(path)
+    if path == '/cloud' or path.startswith('/cloud/'):
+        path = path[len('/cloud'):]
+    return path or '/'
+
+
+def build_scan_command(path, shallow=True):
+    command = occ_scan_command + ['-p', path]
+    if shallow:
+        command.append('--shallow')
+    return command
+
+
+def sudo_input():
+    return f'{sudo_password}\n'.encode() if sudo_password else b''
+
+
+def run_occ_scan(path, shallow=True):
+    path = normalize_index_path(path)
+    command = build_scan_command(path, shallow)
+    try:
+        process = subprocess.run(command, input=sudo_input(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = process.stdout.decode(errors='replace')
+        if process.returncode != 0:
+            logger.error(f"Error executing command: {command}, stderr: {process.stderr.decode(errors='replace')}")
+        return {'path': path, 'ok': process.returncode == 0, 'returncode': process.returncode, 'output': output}
+    except Exception as e:
+        logger.error(f"Error executing command: {command}, {e}")
+        return {'path': path, 'ok': False, 'returncode': None, 'output': str(e)}
+
+
+class ScanJob:
+    def __init__(self, path, shallow, future):
+        self.path = path
+        self.shallow = shallow
+        self.future = future
+        self.scheduled = False
+        self.merged = False
+
+    def covers(self, path, shallow):
+        if self.path == path:
+            return shallow or not self.shallow
+        # a shallow scan does not look into subfolders, so only a recursive one can absorb a child path
+        return not self.shallow and path.startswith(self.path.rstrip('/') + '/')
+
+
+class IndexScheduler:
+    """
+    Requests join a queued scan that covers them until that scan gets a slot of the semaphore. A scan
+    that is already running may have listed the folder before the request's files arrived, so the
+    request gets one follow-up scan instead, which starts once the running scan of the path is done.
+    """
+
+    def __init__(self, debounce=debounce_seconds, max_parallel=max_parallel_scans):
+        self.debounce = debounce
+        self.semaphore = asyncio.Semaphore(max_parallel)
+        self.queued_jobs = {}
+        self.running_jobs = {}
+        self.flush_handle = None
+
+    def submit(self, path, shallow=True):
+        path = normalize_index_path(path)
+        loop = asyncio.get_running_loop()
+
+        for job in self.queued_jobs.values():
+            if job.covers(path, shallow):
+                return job.future
+
+        job = ScanJob(path, shallow, loop.create_future())
+
+        for queued_path, queued_job in list(self.queued_jobs.items()):
+            if job.covers(queued_job.path, queued_job.shallow):
+                del self.queued_jobs[queued_path]
+                queued_job.merged = True
+                job.future.add_done_callback(
+                    lambda done, merged=queued_job.future: merged.done() or merged.set_result(done.result()))
+
+        self.queued_jobs[path] = job
+
+        if not self.flush_handle:
+            self.flush_handle = loop.call_later(self.debounce, self.flush)
+
+        return job.future
+
+    def flush(self):
+        self.flush_handle = None
+
+        for job in self.queued_jobs.values():
+            if not job.scheduled:
+                job.scheduled = True
+                asyncio.create_task(self.run_scan(job))
+
+    async def run_scan(self, job):
+        running_job = self.running_jobs.get(job.path)
+        if running_job:
+            await asyncio.wait([running_job.future])
+        if job.merged:
+            return
+
+        async with self.semaphore:
+            if job.merged:
+                return
+            if self.queued_jobs.get(job.path) is job:
+                del self.queued_jobs[job.path]
+            self.running_jobs[job.path] = job
+
+            command = build_scan_command(job.path, job.shallow)
+            logger.info(f'scan started: {job.path} (shallow: {job.shallow})')
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE)
+                stdout, stderr = await process.communicate(sudo_input())
+                result = {'path': job.path, 'ok': process.returncode == 0,
+                          'returncode': process.returncode, 'output': stdout.decode(errors='replace')}
+                if process.returncode != 0:
+                    logger.error(f"Error executing command: {command}, stderr: {stderr.decode(errors='replace')}")
+            except Exception as e:
+                logger.error(f"Error executing command: {command}, {e}")
+                result = {'path': job.path, 'ok': False, 'returncode': None, 'output': str(e)}
+            finally:
+                if self.running_jobs.get(job.path) is job:
+                    del self.running_jobs[job.path]
+
+        logger.info(f'scan finished: {job.path}, ok: {result["ok"]}')
+        job.future.set_result(result)
+
+
+class IndexService:
+    def __init__(self, socket_path=index_socket_path):
+        self.socket_path = socket_path
+        self.scheduler = None
+
+    async def handle_client(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            result = await self.scheduler.submit(request['path'], request.get('shallow', True))
+        except Exception as e:
+            logger.error(f'index request error: {e}')
+            result = {'ok': False, 'returncode': None, 'output': str(e)}
+
+        try:
+            writer.write(json.dumps(result, ensure_ascii=False).encode() + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.scheduler = IndexScheduler()
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o666)
+        logger.info(f'index service listening on {self.socket_path}')
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        async with server:
+            await stop_event.wait()
+
+        os.remove(self.socket_path)
+
+
+class IndexClient:
+    executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='index_client')
+
+    def __init__(self, socket_path=index_socket_path, timeout=client_timeout, max_queued=client_max_queued):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.lock = threading.Lock()
+        self.queued_requests = {}
+
+    def request_index(self, path, shallow=True):
+        """
+        Returns a concurrent.futures.Future resolved with the scan result dict. A request for a path that
+        is still waiting for a client thread shares that request's future.
+        """
+        key = (normalize_index_path(path), shallow)
+        with self.lock:
+            if key in self.queued_requests:
+                return self.queued_requests[key]
+
+            if len(self.queued_requests) >= self.max_queued:
+                logger.error(f'index client queue full ({self.max_queued} paths), dropping request for {path}')
+                future = Future()
+                future.set_result({'path': key[0], 'ok': False, 'returncode': None, 'output': 'index queue full'})
+                return future
+
+            future = self.executor.submit(contextvars.copy_context().run, self.send_queued_request, key, path, shallow)
+            self.queued_requests[key] = future
+        return future
+
+    def send_queued_request(self, key, path, shallow):
+        with self.lock:
+            self.queued_requests.pop(key, None)
+        return self.send_request(path, shallow)
+
+    def send_request(self, path, shallow=True):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(self.timeout)
+                client.connect(self.socket_path)
+                client.sendall(json.dumps({'path': path, 'shallow': shallow}, ensure_ascii=False).encode() + b'\n')
+                with client.makefile('rb') as response:
+                    return json.loads(response.readline())
+        except (OSError, ValueError) as e:
+            # refused, missing or unreadable socket, timeout, or a reply cut short by a restart of the service
+            logger.warning(f'index service unavailable ({e}), running occ directly for {path}')
+            return run_occ_scan(path, shallow)
+
+
+async def request_index_async(path, shallow=True, socket_path=index_socket_path):
+    try:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        try:
+            writer.write(json.dumps({'path': path, 'shallow': shallow}, ensure_ascii=False).encode() + b'\n')
+            await writer.drain()
+            return json.loads(await reader.readline())
+        finally:
+            writer.close()
+    except (OSError, ValueError) as e:
+        logger.warning(f'index service unavailable ({e}), running occ directly for {path}')
+        return await asyncio.to_thread(run_occ_scan, path, shallow)
+
+
+index_client = IndexClient()
+
+
+if __name__ == '__main__':
+    logger.add("index_service.log",
+               format="{time} {level} {message}",
+               rotation="10 MB",
+               compression='zip',
+               level="INFO")
+
+    asyncio.run(IndexService().serve())
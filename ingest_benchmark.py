@@ -0,0 +1,269 @@
+import argparse
+import functools
+import io
+import json
+import os
+import pwd
+import grp
+import random
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime
+
+from loguru import logger
+
+from photos_copy_script import FileCopier
+
+counted_os_functions = ('stat', 'lstat', 'scandir', 'listdir', 'rename', 'replace', 'chown', 'chmod',
+                        'open', 'fsync', 'makedirs', 'mkdir', 'remove', 'copy_file_range', 'sendfile')
+
+
+class CallCounter:
+    def __init__(self):
+        self.os_calls = Counter()
+        self.subprocess_spawns = 0
+        self.originals = []
+
+    def install(self):
+        for name in counted_os_functions:
+            if hasattr(os, name):
+                self.wrap(os, name, lambda name=name: self.os_calls.update([name]))
+        self.wrap(subprocess.Popen, '__init__', self.count_spawn)
+        self.wrap(os, 'system', self.count_spawn)
+
+    def wrap(self, owner, name, on_call):
+        original = getattr(owner, name)
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            on_call()
+            return original(*args, **kwargs)
+
+        self.originals.append((owner, name, original))
+        setattr(owner, name, wrapper)
+
+    def count_spawn(self):
+        self.subprocess_spawns += 1
+
+    def uninstall(self):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+
+class JpegFactory:
+    def __init__(self, min_size_kb, max_size_kb):
+        self.min_size = min_size_kb * 1024
+        self.max_size = max_size_kb * 1024
+        self.base_images = []
+
+    def prepare(self, variants=4):
+        try:
+            from PIL import Image
+        except ImportError:
+            logger.warning('Pillow is not installed, writing synthetic JPEG streams')
+            return
+
+        for _ in range(variants):
+            target = random.randint(self.min_size, self.max_size)
+            side = max(64, int((target * 2) ** 0.5 / 1.2))
+            image = Image.effect_noise((side, side), random.randint(20, 80)).convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=90)
+            self.base_images.append(buffer.getvalue())
+
+    def make(self, index):
+        # a COM segment right after SOI makes every file unique without breaking the stream
+        comment = f'benchmark file {index} {random.random()}'.encode()
+        comment_segment = b'\xff\xfe' + struct.pack('>H', len(comment) + 2) + comment
+        if self.base_images:
+            base = random.choice(self.base_images)
+            return base[:2] + comment_segment + base[2:]
+        size = random.randint(self.min_size, self.max_size)
+        return b'\xff\xd8' + comment_segment + os.urandom(size) + b'\xff\xd9'
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def hour_boundary_timestamps(files_count, hour_spread):
+    now = time.time()
+    current_hour = now - now % 3600
+    timestamps = []
+    for _ in range(files_count):
+        if hour_spread <= 0:
+            timestamps.append(None)
+            continue
+        boundary = current_hour - 3600 * random.randint(0, hour_spread - 1)
+        timestamps.append(min(now, boundary + random.uniform(-120, 120)))
+    return timestamps
+
+
+class CameraDrop:
+    def __init__(self, base_path, factory, args):
+        self.base_path = base_path
+        self.factory = factory
+        self.args = args
+        self.written_at = {}
+        self.bytes_written = 0
+
+    def run(self):
+        index = 0
+        for burst in range(self.args.bursts):
+            timestamps = hour_boundary_timestamps(self.args.burst_files, self.args.hour_spread)
+            for timestamp in timestamps:
+                self.write_file(f'IMG_{index:05d}.jpg', self.factory.make(index), timestamp)
+                index += 1
+                if self.args.write_rate > 0:
+                    time.sleep(1 / self.args.write_rate)
+            if burst < self.args.bursts - 1:
+                time.sleep(self.args.burst_gap)
+
+    def write_file(self, filename, content, timestamp):
+        file_path = os.path.join(self.base_path, filename)
+        chunks = max(1, self.args.write_chunks)
+        chunk_size = len(content) // chunks + 1
+
+        with open(file_path, 'wb') as file:
+            for offset in range(0, len(content), chunk_size):
+                file.write(content[offset:offset + chunk_size])
+                file.flush()
+                if chunks > 1:
+                    time.sleep(self.args.chunk_delay)
+
+        if timestamp:
+            os.utime(file_path, (timestamp, timestamp))
+
+        self.written_at[filename] = time.time()
+        self.bytes_written += len(content)
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='ingest_bench_')
+    base_path = os.path.join(work_dir, 'studio')
+    os.makedirs(base_path)
+
+    config = {
+        'Studio_name': 'bench',
+        'BaseDirPath': base_path,
+        'FileExtension': '.jpg',
+        'TimeZoneName': args.timezone,
+        'FileSizeCheckInterval': str(args.stability_interval),
+        'IterationSleepTime': str(args.iteration_sleep),
+        'FirstFileDelayTime': '0',
+        'WatchMode': args.watch_mode,
+        'JournalFile': os.path.join(work_dir, 'journal.db'),
+    }
+
+    file_copier = FileCopier(config)
+    current_user = pwd.getpwuid(os.getuid()).pw_name
+    file_copier.permission_manager.user = current_user
+    file_copier.permission_manager.group = grp.getgrgid(os.getgid()).gr_name
+
+    index_requests = Counter()
+    file_copier.run_index = lambda path: index_requests.update([path])
+
+    moved_at = {}
+    original_move = file_copier.file_mover.move
+
+    def timed_move(source_file, destination_file):
+        original_move(source_file, destination_file)
+        moved_at[os.path.basename(destination_file)] = time.time()
+
+    file_copier.file_mover.move = timed_move
+
+    factory = JpegFactory(args.min_size_kb, args.max_size_kb)
+    factory.prepare()
+    camera_drop = CameraDrop(base_path, factory, args)
+    total_files = args.bursts * args.burst_files
+
+    call_counter = CallCounter()
+    call_counter.install()
+    started = time.perf_counter()
+
+    copier_thread = threading.Thread(target=file_copier.run, name='bench_copier', daemon=True)
+    copier_thread.start()
+    camera_drop.run()
+
+    deadline = time.time() + args.timeout
+    while len(moved_at) < total_files and time.time() < deadline:
+        time.sleep(0.05)
+
+    elapsed = time.perf_counter() - started
+    file_copier.stop_event.set()
+    copier_thread.join(timeout=30)
+    call_counter.uninstall()
+
+    latencies = [moved_at[name] - camera_drop.written_at[name] for name in moved_at if name in camera_drop.written_at]
+    moved_files = len(moved_at)
+    per_file = max(1, moved_files)
+
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'json'},
+        'files_written': total_files,
+        'files_moved': moved_files,
+        'megabytes_written': round(camera_drop.bytes_written / (1024 * 1024), 2),
+        'elapsed_seconds': round(elapsed, 3),
+        'files_per_second': round(moved_files / elapsed, 3) if elapsed else None,
+        'latency_seconds': {
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies) if latencies else None,
+        },
+        'os_calls_per_file': {name: round(count / per_file, 2) for name, count in sorted(call_counter.os_calls.items())},
+        'subprocess_spawns_per_file': round(call_counter.subprocess_spawns / per_file, 3),
+        'index_requests': sum(index_requests.values()),
+        'move_methods': dict(file_copier.file_mover.method_counts),
+    }
+
+    if file_copier.journal:
+        file_copier.journal.close()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic camera drop benchmark for FileCopier")
+    parser.add_argument("--bursts", type=int, default=1)
+    parser.add_argument("--burst-files", type=int, default=100)
+    parser.add_argument("--burst-gap", type=float, default=5, help="Seconds between bursts")
+    parser.add_argument("--min-size-kb", type=int, default=2048)
+    parser.add_argument("--max-size-kb", type=int, default=8192)
+    parser.add_argument("--write-rate", type=float, default=0, help="Files per second, 0 for no limit")
+    parser.add_argument("--write-chunks", type=int, default=1, help="Write every file in this many chunks")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="Seconds between chunks")
+    parser.add_argument("--hour-spread", type=int, default=2,
+                        help="Spread file times around this many hour boundaries, 0 keeps the real time")
+    parser.add_argument("--watch-mode", choices=['poll', 'inotify'], default='poll')
+    parser.add_argument("--stability-interval", type=int, default=1, help="FileSizeCheckInterval")
+    parser.add_argument("--iteration-sleep", type=int, default=1, help="IterationSleepTime")
+    parser.add_argument("--timezone", default='Europe/Moscow')
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", help="Append the result as one JSON line to this file")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    logger.remove()
+    logger.add(os.path.join(tempfile.gettempdir(), 'ingest_benchmark.log'), level="INFO")
+
+    benchmark_result = run_benchmark(arguments)
+    print(json.dumps(benchmark_result, indent=4, ensure_ascii=False))
+
+    if arguments.json:
+        with open(arguments.json, 'a', encoding='utf-8') as results_file:
+            results_file.write(json.dumps(benchmark_result, ensure_ascii=False) + '\n')
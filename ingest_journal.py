@@ -0,0 +1,176 @@
+import sqlite3
+import threading
+import time
+
+
+class IngestJournal:
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.lock = threading.Lock()
+        # ingest_files rows as last written, so a sync only touches the rows that changed
+        self.synced_rows = None
+        self.connection = sqlite3.connect(journal_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS first_file_timestamps (
+                    destination_path TEXT PRIMARY KEY,
+                    timestamp REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS ingest_files (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    first_seen_mtime REAL NOT NULL,
+                    ready_at REAL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS hour_folders (
+                    destination_path TEXT PRIMARY KEY,
+                    first_moved_at REAL NOT NULL,
+                    last_moved_at REAL NOT NULL,
+                    files_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS sealed_hour_folders (
+                    destination_path TEXT PRIMARY KEY,
+                    sealed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS content_hashes (
+                    destination_path TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    added_at REAL NOT NULL,
+                    PRIMARY KEY (destination_path, file_name)
+                );
+                CREATE INDEX IF NOT EXISTS content_hashes_digest ON content_hashes (destination_path, digest);
+            ''')
+
+    def load_first_file_timestamps(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT destination_path, timestamp FROM first_file_timestamps').fetchall()
+        return dict(rows)
+
+    def set_first_file_timestamp(self, destination_path, timestamp):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO first_file_timestamps VALUES (?, ?)',
+                                    (destination_path, timestamp))
+
+    def delete_first_file_timestamp(self, destination_path):
+        with self.lock:
+            self.connection.execute('DELETE FROM first_file_timestamps WHERE destination_path = ?',
+                                    (destination_path,))
+
+    def load_records(self):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT name, size, mtime_ns, state, first_seen, first_seen_mtime, ready_at, updated '
+                'FROM ingest_files').fetchall()
+            self.synced_rows = {row[0]: row for row in rows}
+        return rows
+
+    def sync_records(self, records):
+        if self.synced_rows is None:
+            self.load_records()
+
+        rows = {record.name: (record.name, record.size, record.mtime_ns, record.state.value, record.first_seen,
+                              record.first_seen_mtime, record.ready_at, record.updated) for record in records}
+        changed = [row for name, row in rows.items() if self.synced_rows.get(name) != row]
+        removed = [(name,) for name in self.synced_rows if name not in rows]
+        if not changed and not removed:
+            return
+
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany('INSERT OR REPLACE INTO ingest_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                            changed)
+                self.connection.executemany('DELETE FROM ingest_files WHERE name = ?', removed)
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.synced_rows = rows
+
+    def record_moved_file(self, destination_path, moved_at=None):
+        moved_at = moved_at or time.time()
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO hour_folders (destination_path, first_moved_at, last_moved_at, files_count) '
+                'VALUES (?, ?, ?, 1) ON CONFLICT(destination_path) DO UPDATE SET '
+                'last_moved_at = excluded.last_moved_at, files_count = files_count + 1',
+                (destination_path, moved_at, moved_at))
+
+    def load_hour_folders(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT destination_path, first_moved_at, last_moved_at, files_count FROM hour_folders').fetchall()
+
+    def load_unsealed_hour_folders(self):
+        # folders that got files after they were sealed are returned again
+        with self.lock:
+            return self.connection.execute(
+                'SELECT h.destination_path, h.first_moved_at, h.last_moved_at, h.files_count FROM hour_folders h '
+                'LEFT JOIN sealed_hour_folders s ON s.destination_path = h.destination_path '
+                'WHERE s.sealed_at IS NULL OR h.last_moved_at > s.sealed_at').fetchall()
+
+    def mark_hour_folder_sealed(self, destination_path, sealed_at):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO sealed_hour_folders VALUES (?, ?)',
+                                    (destination_path, sealed_at))
+
+    def find_content_hash(self, destination_path, digest):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT file_name FROM content_hashes WHERE destination_path = ? AND digest = ?',
+                (destination_path, digest)).fetchone()
+        return row[0] if row else None
+
+    def load_content_hash_names(self, destination_path):
+        with self.lock:
+            rows = self.connection.execute('SELECT file_name FROM content_hashes WHERE destination_path = ?',
+                                           (destination_path,)).fetchall()
+        return {row[0] for row in rows}
+
+    def add_content_hash(self, destination_path, file_name, size, digest):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?, ?)',
+                                    (destination_path, file_name, size, digest, time.time()))
+
+    def delete_content_hash(self, destination_path, file_name):
+        with self.lock:
+            self.connection.execute('DELETE FROM content_hashes WHERE destination_path = ? AND file_name = ?',
+                                    (destination_path, file_name))
+
+    def prune(self, max_age_days, sealed_only=True):
+        """
+        Forgets hour folders, seal marks, content hashes and first file timestamps older than max_age_days.
+        With sealed_only an hour folder is kept until it was sealed after its last file.
+        """
+        cutoff = time.time() - max_age_days * 86400
+        sealed_condition = ('AND EXISTS (SELECT 1 FROM sealed_hour_folders s WHERE '
+                            's.destination_path = hour_folders.destination_path AND '
+                            's.sealed_at >= hour_folders.last_moved_at)') if sealed_only else ''
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.execute(f'DELETE FROM hour_folders WHERE last_moved_at < ? {sealed_condition}',
+                                        (cutoff,))
+                self.connection.execute('DELETE FROM sealed_hour_folders WHERE sealed_at < ? AND destination_path '
+                                        'NOT IN (SELECT destination_path FROM hour_folders)', (cutoff,))
+                self.connection.execute('DELETE FROM content_hashes WHERE added_at < ?', (cutoff,))
+                self.connection.execute('DELETE FROM first_file_timestamps WHERE timestamp < ?', (cutoff,))
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
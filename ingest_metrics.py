@@ -0,0 +1,130 @@
+import threading
+import time
+
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+stages = ('detection', 'stability', 'hash', 'move', 'chown', 'index', 'total')
+histogram_buckets = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class IngestMetrics:
+    def __init__(self, studio, max_samples=2000):
+        self.studio = escape_label(studio)
+        self.lock = threading.Lock()
+        self.samples = {stage: deque(maxlen=max_samples) for stage in stages}
+        self.bucket_counts = {stage: [0] * len(histogram_buckets) for stage in stages}
+        self.sums = Counter()
+        self.counts = Counter()
+        self.files_total = Counter()
+        self.moved_timestamps = deque()
+        self.state_provider = None
+
+    def observe(self, stage, seconds):
+        seconds = max(0.0, seconds)
+        with self.lock:
+            self.samples[stage].append(seconds)
+            self.sums[stage] += seconds
+            self.counts[stage] += 1
+            for index, bucket in enumerate(histogram_buckets):
+                if seconds <= bucket:
+                    self.bucket_counts[stage][index] += 1
+
+    def record_file(self, result):
+        now = time.time()
+        with self.lock:
+            self.files_total[result] += 1
+            if result == 'moved':
+                self.moved_timestamps.append(now)
+            self.trim_moved_timestamps(now)
+
+    def trim_moved_timestamps(self, now):
+        while self.moved_timestamps and self.moved_timestamps[0] < now - 60:
+            self.moved_timestamps.popleft()
+
+    @staticmethod
+    def quantile(values, q):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def render(self):
+        studio = self.studio
+        lines = [
+            '# HELP ingest_stage_seconds Per-file duration of an ingest stage',
+            '# TYPE ingest_stage_seconds histogram',
+        ]
+        with self.lock:
+            self.trim_moved_timestamps(time.time())
+
+            for stage in stages:
+                for bucket, count in zip(histogram_buckets, self.bucket_counts[stage]):
+                    lines.append(f'ingest_stage_seconds_bucket{{studio="{studio}",stage="{stage}",le="{bucket}"}} {count}')
+                lines.append(f'ingest_stage_seconds_bucket{{studio="{studio}",stage="{stage}",le="+Inf"}} '
+                             f'{self.counts[stage]}')
+                lines.append(f'ingest_stage_seconds_sum{{studio="{studio}",stage="{stage}"}} {self.sums[stage]:.6f}')
+                lines.append(f'ingest_stage_seconds_count{{studio="{studio}",stage="{stage}"}} {self.counts[stage]}')
+
+            lines += ['# HELP ingest_stage_quantile_seconds p50/p95 over the recent samples of a stage',
+                      '# TYPE ingest_stage_quantile_seconds gauge']
+            for stage in stages:
+                for q in (0.5, 0.95):
+                    value = self.quantile(self.samples[stage], q)
+                    lines.append(f'ingest_stage_quantile_seconds{{studio="{studio}",stage="{stage}",quantile="{q}"}} '
+                                 f'{value:.6f}')
+
+            lines += ['# HELP ingest_files_total Files handled by result',
+                      '# TYPE ingest_files_total counter']
+            for result, count in sorted(self.files_total.items()):
+                lines.append(f'ingest_files_total{{studio="{studio}",result="{result}"}} {count}')
+
+            lines += ['# HELP ingest_files_per_minute Files moved during the last minute',
+                      '# TYPE ingest_files_per_minute gauge',
+                      f'ingest_files_per_minute{{studio="{studio}"}} {len(self.moved_timestamps)}']
+
+        if self.state_provider:
+            lines += ['# HELP ingest_files_in_state Files currently tracked in the ingest table',
+                      '# TYPE ingest_files_in_state gauge']
+            for state, count in sorted(self.state_provider().items()):
+                lines.append(f'ingest_files_in_state{{studio="{studio}",state="{state}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    def __init__(self, metrics, port, host='0.0.0.0'):
+        metrics_instance = metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_instance.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name=f'metrics_{port}')
+
+    def start(self):
+        self.thread.start()
+        logger.info(f'metrics endpoint listening on port {self.server.server_address[1]}')
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
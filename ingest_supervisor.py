@@ -0,0 +1,150 @@
+import asyncio
+import glob
+import os
+import signal
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import setproctitle
+from loguru import logger
+
+from hour_events import check_seal_events
+from photos_copy_script import FileCopier, read_config
+
+config_rescan_interval = 60
+studio_restart_delay = 60
+
+
+class StudioRunner:
+    def __init__(self, config_file, settings, file_copier):
+        self.config_file = config_file
+        self.settings = settings
+        self.file_copier = file_copier
+        self.thread_name = f'copier_{os.path.basename(config_file).replace("_config.ini", "")}'
+        self.log_handler_id = None
+        self.task = None
+
+
+class IngestSupervisor:
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+        self.runners = {}
+        self.stop_event = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='copier')
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop_event.set)
+
+        while not self.stop_event.is_set():
+            self.sync_studios()
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=config_rescan_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        logger.info('stopping all studios')
+        for config_file in list(self.runners):
+            await self.stop_studio(config_file)
+
+    def sync_studios(self):
+        config_files = set(glob.glob(os.path.join(self.config_dir, '*_config.ini')))
+
+        for config_file in set(self.runners) - config_files:
+            logger.info(f'config removed: {config_file}')
+            asyncio.create_task(self.stop_studio(config_file))
+
+        for config_file in sorted(config_files):
+            try:
+                settings = dict(read_config(config_file))
+            except Exception as e:
+                logger.error(f'error reading config {config_file}: {e}')
+                continue
+
+            runner = self.runners.get(config_file)
+            if runner and runner.settings == settings:
+                continue
+
+            if runner:
+                logger.info(f'config changed: {config_file}')
+                asyncio.create_task(self.restart_studio(config_file))
+            else:
+                self.start_studio(config_file)
+
+    def start_studio(self, config_file):
+        config = read_config(config_file)
+        check_seal_events([config_file])
+        try:
+            file_copier = FileCopier(config)
+        except Exception as e:
+            logger.error(f'error creating copier for {config_file}: {e}')
+            return
+
+        runner = StudioRunner(config_file, dict(config), file_copier)
+
+        if config.get("LogFile"):
+            runner.log_handler_id = logger.add(
+                config.get("LogFile"),
+                format="{time} {level} {message}",
+                rotation="10 MB",
+                compression='zip',
+                level="INFO",
+                filter=lambda record, name=runner.thread_name: record['extra'].get('studio') == name)
+
+        runner.task = asyncio.create_task(self.run_studio(runner))
+        self.runners[config_file] = runner
+        logger.info(f'studio started: {config.get("Studio_name")} ({config_file})')
+
+    async def stop_studio(self, config_file):
+        runner = self.runners.pop(config_file, None)
+        if not runner:
+            return
+
+        runner.file_copier.stop()
+        await runner.task
+
+        if runner.log_handler_id is not None:
+            logger.remove(runner.log_handler_id)
+        logger.info(f'studio stopped: {config_file}')
+
+    async def restart_studio(self, config_file):
+        await self.stop_studio(config_file)
+        if not self.stop_event.is_set() and os.path.exists(config_file):
+            self.start_studio(config_file)
+
+    async def run_studio(self, runner):
+        loop = asyncio.get_running_loop()
+        file_copier = runner.file_copier
+        studio_logger = logger.bind(studio=runner.thread_name)
+
+        while not file_copier.stop_event.is_set():
+            try:
+                await loop.run_in_executor(self.executor, self.run_copier, runner)
+            except Exception as e:
+                studio_logger.error(f'studio {runner.config_file} failed: {e}')
+
+            if not file_copier.stop_event.is_set():
+                studio_logger.info(f'restarting {runner.config_file} in {studio_restart_delay} s')
+                await loop.run_in_executor(None, file_copier.stop_event.wait, studio_restart_delay)
+
+    @staticmethod
+    def run_copier(runner):
+        threading.current_thread().name = runner.thread_name
+        # threads and callbacks the copier starts copy this context, so their records reach the studio log too
+        with logger.contextualize(studio=runner.thread_name):
+            logger.info(f'BaseDirPath: {runner.file_copier.config.get("BaseDirPath")}')
+            runner.file_copier.run()
+
+
+if __name__ == "__main__":
+    setproctitle.setproctitle("copy_script_supervisor")
+
+    logger.add("ingest_supervisor.log",
+               format="{time} {level} {thread.name} {message}",
+               rotation="10 MB",
+               compression='zip',
+               level="INFO")
+
+    asyncio.run(IngestSupervisor(os.getcwd()).run())
@@ -0,0 +1,115 @@
+import os
+import time
+
+from collections import Counter
+from enum import Enum
+
+
+class IngestState(str, Enum):
+    SEEN = 'seen'
+    STABILIZING = 'stabilizing'
+    READY = 'ready'
+    MOVED = 'moved'
+    DUPLICATE = 'duplicate'
+    FAILED = 'failed'
+
+
+# the source file is gone once a record reaches one of these states
+final_states = (IngestState.MOVED, IngestState.DUPLICATE)
+
+
+class IngestRecord:
+    def __init__(self, name, size, mtime_ns):
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.state = IngestState.SEEN
+        self.first_seen = time.time()
+        self.first_seen_mtime = mtime_ns / 1e9
+        self.ready_at = None
+        self.updated = self.first_seen
+
+    def set_state(self, state):
+        self.state = state
+        self.updated = time.time()
+        if state == IngestState.READY and self.ready_at is None:
+            self.ready_at = self.updated
+
+
+class IngestTable:
+    def __init__(self, allowed_extension):
+        self.allowed_extension = allowed_extension.lower()
+        self.records = {}
+
+    def scan(self, base_path, filenames=None, closed_files=()):
+        """
+        One os.scandir pass over base_path, limited to filenames when given. Files with the same size
+        and mtime as on the previous pass become READY, closed_files (closed by their writer, as
+        reported by inotify) become READY at once. Returns the names that became READY on this pass.
+        """
+        became_ready = []
+        found = set()
+
+        with os.scandir(base_path) as entries:
+            for entry in entries:
+                if filenames is not None and entry.name not in filenames:
+                    continue
+                if not entry.name.lower().endswith(self.allowed_extension):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                found.add(entry.name)
+                record = self.records.get(entry.name)
+
+                closed = entry.name in closed_files
+
+                if not record or record.state in final_states:
+                    record = self.records[entry.name] = IngestRecord(entry.name, stat.st_size, stat.st_mtime_ns)
+                    if closed:
+                        record.set_state(IngestState.READY)
+                        became_ready.append(entry.name)
+                elif (record.size, record.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                    record.size, record.mtime_ns = stat.st_size, stat.st_mtime_ns
+                    record.set_state(IngestState.READY if closed else IngestState.STABILIZING)
+                    if closed:
+                        became_ready.append(entry.name)
+                elif record.state in (IngestState.SEEN, IngestState.STABILIZING):
+                    record.set_state(IngestState.READY)
+                    became_ready.append(entry.name)
+
+        for name, record in list(self.records.items()):
+            if name in found:
+                continue
+            # with inotify only the event names are listed, held records outside them are checked one by one
+            listed = filenames is None or name in filenames
+            if listed or record.state in final_states or not os.path.isfile(os.path.join(base_path, name)):
+                del self.records[name]
+
+        return sorted(became_ready)
+
+    def restore(self, rows):
+        for name, size, mtime_ns, state, first_seen, first_seen_mtime, ready_at, updated in rows:
+            if IngestState(state) in final_states:
+                continue
+            record = IngestRecord(name, size, mtime_ns)
+            record.state = IngestState(state)
+            record.first_seen = first_seen
+            record.first_seen_mtime = first_seen_mtime
+            record.ready_at = ready_at
+            record.updated = updated
+            self.records[name] = record
+
+    def files_in_state(self, *states):
+        return sorted(name for name, record in self.records.items() if record.state in states)
+
+    def set_state(self, name, state):
+        if name in self.records:
+            self.records[name].set_state(state)
+
+    def state_counts(self):
+        return Counter(record.state.value for record in self.records.values())
@@ -0,0 +1,73 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+event_header = struct.Struct('iIII')
+
+
+class InotifyUnavailable(Exception):
+    pass
+
+
+class InotifyWatcher:
+    def __init__(self, path, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+        self.path = path
+        self.libc = self.load_libc()
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise InotifyUnavailable(f'inotify_init1 failed: {os.strerror(ctypes.get_errno())}')
+
+        self.wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if self.wd < 0:
+            error = os.strerror(ctypes.get_errno())
+            os.close(self.fd)
+            raise InotifyUnavailable(f'inotify_add_watch failed for "{path}": {error}')
+
+    @staticmethod
+    def load_libc():
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise InotifyUnavailable('libc not found')
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise InotifyUnavailable(f'inotify is not supported: {e}')
+        return libc
+
+    def read_events(self, timeout=None):
+        """Returns a list of (mask, name) tuples, empty if nothing arrived within timeout."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + event_header.size <= len(data):
+            wd, mask, cookie, name_length = event_header.unpack_from(data, offset)
+            offset += event_header.size
+            name = data[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            events.append((mask, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
@@ -0,0 +1,123 @@
+import fcntl
+import json
+import os
+import tempfile
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from loguru import logger
+
+mailing_path = '/cloud/reflect/files/Рассылка'
+journal_suffix = '_рассылка.jsonl'
+legacy_suffix = '_рассылка.json'
+
+
+class MailingJournal:
+    """
+    One JSON line per shared folder in <studio>_рассылка.jsonl. Appends are single O_APPEND writes,
+    rewrites go through a temporary file and os.replace. Every access holds flock on the mailing
+    directory, so the copier, the mailing script and the bot never see a half-written file.
+    Entries from an old <studio>_рассылка.json are read as well and migrated on the next rewrite.
+    """
+
+    def __init__(self, studio_name, base_path=mailing_path):
+        self.studio_name = studio_name
+        self.base_path = base_path
+        self.journal_file = os.path.join(base_path, f'{studio_name}{journal_suffix}')
+        self.legacy_file = os.path.join(base_path, f'{studio_name}{legacy_suffix}')
+
+    @contextmanager
+    def locked(self, operation):
+        fd = os.open(self.base_path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)
+
+    def append(self, entry):
+        entry = dict(entry, date=entry.get('date') or datetime.now().strftime('%d.%m.%Y'))
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+        with self.locked(fcntl.LOCK_EX):
+            fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def read(self):
+        with self.locked(fcntl.LOCK_SH):
+            return self.read_unlocked()
+
+    def read_unlocked(self):
+        entries = []
+
+        if os.path.isfile(self.legacy_file):
+            with open(self.legacy_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            entries += [dict(entry, date=entry.get('date') or data.get('date'))
+                        for entry in data.get('shared_folders', [])]
+
+        if os.path.isfile(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as file:
+                for line_number, line in enumerate(file, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        logger.error(f'Skipping broken line {line_number} in {self.journal_file}: {e}')
+
+        return entries
+
+    def rewrite(self, entries):
+        with self.locked(fcntl.LOCK_EX):
+            self.write_unlocked(entries)
+
+    def write_unlocked(self, entries):
+        if entries:
+            fd, temp_file = tempfile.mkstemp(dir=self.base_path, prefix=f'.{self.studio_name}', suffix='.part')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                    for entry in entries:
+                        file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.chmod(temp_file, 0o664)
+                os.replace(temp_file, self.journal_file)
+            except Exception:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+        elif os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+        if os.path.exists(self.legacy_file):
+            os.remove(self.legacy_file)
+
+    def remove_entries(self, removed_entries):
+        """Drops removed_entries and keeps everything appended since they were read."""
+        with self.locked(fcntl.LOCK_EX):
+            entries = self.read_unlocked()
+            remaining = list(entries)
+            for entry in removed_entries:
+                if entry in remaining:
+                    remaining.remove(entry)
+            if remaining != entries or os.path.exists(self.legacy_file):
+                self.write_unlocked(remaining)
+            return remaining
+
+    @staticmethod
+    def mailing_date(entries):
+        return entries[-1].get('date', '') if entries else ''
+
+    @staticmethod
+    def studio_names(base_path=mailing_path):
+        names = set()
+        for filename in os.listdir(base_path):
+            for suffix in (journal_suffix, legacy_suffix):
+                if filename.endswith(suffix) and os.path.isfile(os.path.join(base_path, filename)):
+                    names.add(filename[:-len(suffix)])
+        return sorted(names)
@@ -0,0 +1,58 @@
+import grp
+import os
+import pwd
+import stat
+
+from loguru import logger
+
+
+class PermissionManager:
+    """
+    Keeps ingest paths owned by user:group and group-writable. Directories that were already handled
+    are remembered by inode, so each new directory and each moved file is touched once.
+    """
+
+    def __init__(self, root_path, user='www-data', group='www-data'):
+        self.root_path = root_path.rstrip('/')
+        self.user = user
+        self.group = group
+        self.uid = None
+        self.gid = None
+        self.prepared_directories = {}
+
+    def resolve_ids(self):
+        if self.uid is None:
+            self.uid = pwd.getpwnam(self.user).pw_uid
+            self.gid = grp.getgrnam(self.group).gr_gid
+
+    def ensure_directory(self, directory_path):
+        try:
+            self.resolve_ids()
+            directory_path = directory_path.rstrip('/')
+
+            while directory_path and directory_path != '/':
+                directory_stat = os.stat(directory_path)
+                if self.prepared_directories.get(directory_path) == directory_stat.st_ino:
+                    break
+                self.apply(directory_path, directory_stat)
+                self.prepared_directories[directory_path] = directory_stat.st_ino
+                directory_path = os.path.dirname(directory_path)
+
+        except Exception as e:
+            logger.error(f"Error changing ownership of '{directory_path}' and its parent directories: {e}")
+
+    def ensure_file(self, file_path):
+        try:
+            self.resolve_ids()
+            self.apply(file_path, os.stat(file_path))
+        except Exception as e:
+            logger.error(f"Error changing ownership of '{file_path}': {e}")
+
+    def apply(self, path, path_stat):
+        if (path_stat.st_uid, path_stat.st_gid) != (self.uid, self.gid):
+            os.chown(path, self.uid, self.gid)
+
+        # like the former `chmod -R g+w`, write permission is only added inside the studio root
+        inside_root = path == self.root_path or path.startswith(self.root_path + '/')
+        if inside_root and not path_stat.st_mode & stat.S_IWGRP:
+            os.chmod(path, stat.S_IMODE(path_stat.st_mode) | stat.S_IWGRP)
@@ -1,14 +1,10 @@
+import contextvars
 import os
-import shutil
-import subprocess
+import queue
 import sys
+import threading
 import time
-import json
-import pwd
-import grp
 import requests
-import pytz
-import setproctitle
 
 from datetime import datetime, timedelta
 from configparser import ConfigParser
@@ -16,64 +12,108 @@ from requests.auth import HTTPBasicAuth
 from dotenv import load_dotenv
 from loguru import logger
 
+from ingest_tracker import IngestTable, IngestState
+from birth_time import birth_time_provider
+from content_hash import ContentHasher
+from file_mover import FileMover
+from hour_events import HourEventQueue, check_seal_events, seal_consumers
+from index_service import index_client
+from ingest_journal import IngestJournal
+from ingest_metrics import IngestMetrics, MetricsServer
+from inotify_watcher import InotifyWatcher, InotifyUnavailable, IN_Q_OVERFLOW, IN_ISDIR
+from mailing_journal import MailingJournal, mailing_path
 from nextcloud_ocs import NextcloudOCS
-from tg_bot import TelegramBot
+from permissions import PermissionManager
+from preview_generator import preview_generator
+from studio_paths import StudioPathResolver
 from yclients_api import YclientsService
 
+load_dotenv()
+# quarantined duplicates, outside the studio folders so Nextcloud scans never pick them up
+duplicates_dir = os.environ.get('DUPLICATES_DIR', '/cloud/copy_script/duplicates')
 
-class FileCopier:
-    def __init__(self, config):
+# wakes run_watcher from its wait on the work queue when the copier is stopped
+stop_signal = object()
+
+
+class FileCopier(StudioPathResolver):
+    shared_clients = {}
+    shared_clients_lock = threading.Lock()
+
+    def __init__(self, config, nextcloud_ocs=None):
+        super().__init__(config)
         self.destination_path = None
-        self.config = config
-        self.studio_timezone = pytz.timezone(config.get("TimeZoneName"))
         self.already_indexed_folders = []
         self.index_queue = []
         self.moved_file_path = None
         self.file_destination_hour_range = None
         self.all_files_moved = False
-        self.nextcloud_ocs = NextcloudOCS()
-        self.tg_bot = TelegramBot()
-        try:
-            self.yclients_service = YclientsService(config.get("Studio_name"))
-        except:
-            self.yclients_service = None
-        self.shared_folders = []
+        self.nextcloud_client = nextcloud_ocs
+        self.mailing_updated = False
         self.first_file_timestamp = {}
+        self.work_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.journal = None
+        self.last_journal_prune = 0
+        self.ingest_table = IngestTable(config["FileExtension"])
+        self.permission_manager = PermissionManager(config["BaseDirPath"])
+        self.file_mover = FileMover()
+        self.metrics = IngestMetrics(config.get("Studio_name"))
+        self.metrics.state_provider = self.ingest_table.state_counts
+        self.content_hasher = self.create_content_hasher(config.get("DedupMode", "off").lower())
+        self.duplicate_action = config.get("DuplicateAction", "quarantine").lower()
+        self.duplicates_path = self.get_duplicates_path(config)
+        self.hashed_folders = set()
+        self.generate_previews = config.get("GeneratePreviews", "No").lower() == "yes"
+        self.seal_queues = [HourEventQueue(consumer) for consumer in seal_consumers(config)]
+
+    @classmethod
+    def get_shared_client(cls, key, factory):
+        with cls.shared_clients_lock:
+            if key not in cls.shared_clients:
+                cls.shared_clients[key] = factory()
+            return cls.shared_clients[key]
+
+    @property
+    def nextcloud_ocs(self):
+        # the client keeps its token and last response between calls, so every studio has its own
+        if not self.nextcloud_client:
+            self.nextcloud_client = NextcloudOCS()
+        return self.nextcloud_client
+
+    @property
+    def yclients_service(self):
+        studio_name = self.config.get("Studio_name")
+        return self.get_shared_client(f'yclients_{studio_name}', lambda: self.create_yclients_service(studio_name))
 
-    def get_current_month_and_date(self):
-        current_month_ru = datetime.now(self.studio_timezone).strftime('%B')
-        current_month = self.translate_month_to_russian(current_month_ru)
-        current_date = datetime.now(self.studio_timezone).strftime('%d.%m')
-        return current_month, current_date
+    @staticmethod
+    def create_yclients_service(studio_name):
+        try:
+            return YclientsService(studio_name)
+        except Exception as e:
+            logger.error(f'Error creating yclients service: {e}')
+            return None
 
     @staticmethod
-    def translate_month_to_russian(month_name):
-        month_mapping = {
-            'January': 'Январь',
-            'February': 'Февраль',
-            'March': 'Март',
-            'April': 'Апрель',
-            'May': 'Май',
-            'June': 'Июнь',
-            'July': 'Июль',
-            'August': 'Август',
-            'September': 'Сентябрь',
-            'October': 'Октябрь',
-            'November': 'Ноябрь',
-            'December': 'Декабрь'
-        }
-        return month_mapping.get(month_name, month_name)
-
-    def construct_paths(self, current_month, current_date, hour_range):
-        base_path = os.path.join(
-            self.config["BaseDirPath"],
-            f'{current_month} {self.config["Studio_name"].upper()}',
-            current_date,
-            hour_range
-        )
-        return base_path
-
-    def move_file(self, source_file, destination_path, month_path):
+    def get_duplicates_path(config):
+        duplicates_path = config.get("DuplicatesDir") or os.path.join(duplicates_dir, config["Studio_name"])
+        base_path = os.path.realpath(config["BaseDirPath"])
+        if os.path.realpath(duplicates_path).startswith(base_path.rstrip('/') + '/'):
+            logger.warning(f'DuplicatesDir {duplicates_path} is inside BaseDirPath, quarantined copies '
+                           f'will show up in Nextcloud')
+        return duplicates_path
+
+    @staticmethod
+    def create_content_hasher(dedup_mode):
+        if dedup_mode == 'off':
+            return None
+        try:
+            return ContentHasher(dedup_mode)
+        except ValueError as e:
+            logger.error(f'Dedup disabled: {e}')
+            return None
+
+    def move_file(self, source_file, destination_path):
         filename = os.path.basename(source_file)
         destination_file = os.path.join(destination_path, filename)
 
@@ -84,77 +124,233 @@ class FileCopier:
             except Exception as e:
                 logger.error(f"Error creating folder '{destination_path}': {e}")
 
-        self.change_folder_permissions(month_path)
-        self.change_ownership(destination_path)
+        chown_started = time.perf_counter()
+        self.permission_manager.ensure_directory(destination_path)
+        chown_time = time.perf_counter() - chown_started
         # self.run_index(destination_path)
 
         try:
-            shutil.move(source_file, destination_file)
+            move_started = time.perf_counter()
+            self.file_mover.move(source_file, destination_file)
+            self.metrics.observe('move', time.perf_counter() - move_started)
             logger.info(f'File {source_file} moved to {destination_path}')
             self.moved_file_path = destination_file
+
+            chown_started = time.perf_counter()
+            self.permission_manager.ensure_file(destination_file)
+            self.metrics.observe('chown', chown_time + time.perf_counter() - chown_started)
         except Exception as e:
             logger.error(f"Error moving file '{filename}' to '{destination_path}': {e}")
             self.moved_file_path = None
 
-    def process_files(self, base_path):
+    def process_files(self, base_path, filenames=None, closed_files=()):
 
-        allowed_extension = self.config["FileExtension"].lower()
+        self.permission_manager.ensure_directory(base_path)
+        self.run_index(base_path)
 
-        unprocessed_files = False
+        self.ingest_table.scan(base_path, None if filenames is None else set(filenames), closed_files)
+        # files held back earlier (first file delay, failed move) are retried once per call
+        files_to_process = self.ingest_table.files_in_state(IngestState.READY, IngestState.FAILED)
 
+        while True:
+            for filename in files_to_process:
+                # a copy that is not fsynced yet keeps its source until the next flush
+                if self.file_mover.is_pending(os.path.join(base_path, filename)):
+                    continue
+                record = self.ingest_table.records.get(filename)
+                previous_state = record.state if record else None
+                state = self.ingest_file(base_path, filename)
+                self.ingest_table.set_state(filename, state)
+                self.record_ingest_metrics(filename, state, previous_state)
+
+            try:
+                self.file_mover.flush()
+            except Exception as e:
+                logger.error(f"Error flushing copied files: {e}")
+
+            self.sync_journal()
+            self.index_mailing_folder()
+
+            changing_files = self.ingest_table.files_in_state(IngestState.SEEN, IngestState.STABILIZING)
+            if not changing_files:
+                break
+
+            logger.debug(f'files still changing: {len(changing_files)}')
+            if self.stop_event.wait(int(self.config["FileSizeCheckInterval"])):
+                break
+            files_to_process = self.ingest_table.scan(base_path, set(changing_files))
+
+        # if self.destination_path:
+        #     self.chown_files()
+
+    def open_journal(self):
+        if self.journal:
+            return
+
+        journal_file = self.config.get("JournalFile") or f'ingest_journal_{self.config["Studio_name"]}.db'
         try:
-            self.change_ownership(base_path)
-            self.change_folder_permissions(base_path)
-            self.run_index(base_path)
+            self.journal = IngestJournal(journal_file)
+            self.first_file_timestamp.update(self.journal.load_first_file_timestamps())
+            self.ingest_table.restore(self.journal.load_records())
+            logger.info(f'ingest journal {journal_file} loaded: {len(self.ingest_table.records)} files, '
+                        f'{len(self.first_file_timestamp)} delayed folders')
         except Exception as e:
-            logger.error(f"Error changing ownership (process files) of '{base_path}': {e}")
+            logger.error(f'Error opening ingest journal {journal_file}: {e}')
+            self.journal = None
 
-        for filename in os.listdir(base_path):
+    def prune_journal(self):
+        if not self.journal or time.time() - self.last_journal_prune < 3600:
+            return
+        self.last_journal_prune = time.time()
+        try:
+            # without seal consumers hour folders are never sealed, so they are pruned by age alone
+            self.journal.prune(float(self.config.get("JournalRetentionDays", 2)), sealed_only=bool(self.seal_queues))
+        except Exception as e:
+            logger.error(f'Error pruning ingest journal: {e}')
 
-            source_file = os.path.join(base_path, filename)
+    def close_journal(self):
+        if not self.journal:
+            return
+        self.sync_journal()
+        try:
+            self.journal.close()
+        except Exception as e:
+            logger.error(f'Error closing ingest journal: {e}')
+        self.journal = None
 
-            if not (os.path.isfile(source_file)
-                    and filename.lower().endswith(allowed_extension)):
-                continue
+    def stop(self):
+        self.stop_event.set()
+        self.work_queue.put(stop_signal)
+
+    def sync_journal(self):
+        if not self.journal:
+            return
+        try:
+            self.journal.sync_records(self.ingest_table.records.values())
+        except Exception as e:
+            logger.error(f'Error writing ingest journal: {e}')
+
+    def record_ingest_metrics(self, filename, state, previous_state=None):
+        record = self.ingest_table.records.get(filename)
+        if not record or state not in (IngestState.MOVED, IngestState.DUPLICATE, IngestState.FAILED):
+            return
+
+        if state == IngestState.FAILED:
+            # a failed file is retried on every pass, it counts once until it leaves FAILED
+            if previous_state != IngestState.FAILED:
+                self.metrics.record_file('failed')
+            return
+
+        if state == IngestState.DUPLICATE:
+            self.metrics.record_file('duplicate')
+            return
+
+        self.metrics.observe('detection', record.first_seen - record.first_seen_mtime)
+        if record.ready_at:
+            self.metrics.observe('stability', record.ready_at - record.first_seen)
+        self.metrics.observe('total', time.time() - record.mtime_ns / 1e9)
+        self.metrics.record_file('moved')
+
+    def ingest_file(self, base_path, filename):
+
+        source_file = os.path.join(base_path, filename)
 
-            # if not self.creation_date_check(source_file):
-            #     continue
+        # if not self.creation_date_check(source_file):
+        #     return IngestState.READY
 
-            if not self.transfer_active_check(source_file):
-                self.destination_path = None
-                self.moved_file_path = None
-                self.file_destination_hour_range = None
-                unprocessed_files = True
+        (file_creation_month,
+         file_creation_date,
+         self.file_destination_hour_range) = self.get_file_creation_info(source_file)
+
+        if not self.file_destination_hour_range:
+            return IngestState.FAILED
+
+        destination_path = self.construct_paths(file_creation_month,
+                                                file_creation_date,
+                                                self.file_destination_hour_range)
+
+        try:
+            if self.check_first_file_timestamp(destination_path, source_file):
+                content_digest, duplicate_of = self.find_duplicate(source_file, destination_path)
+                if duplicate_of:
+                    self.handle_duplicate(source_file, destination_path, duplicate_of)
+                    return IngestState.DUPLICATE
+
+                self.move_file(source_file, destination_path)
+                if not self.moved_file_path:
+                    return IngestState.FAILED
+                self.destination_path = destination_path
+                if self.journal:
+                    self.journal.record_moved_file(destination_path)
+                    if content_digest:
+                        self.journal.add_content_hash(destination_path, filename,
+                                                      os.path.getsize(self.moved_file_path), content_digest)
+                if self.generate_previews:
+                    preview_generator.submit(self.moved_file_path)
+                return IngestState.MOVED
             else:
-                (file_creation_month,
-                 file_creation_date,
-                 self.file_destination_hour_range) = self.get_file_creation_info(source_file)
+                self.run_index(base_path)
 
-                if not self.file_destination_hour_range:
-                    continue
+        except Exception as e:
+            logger.error(e)
+            return IngestState.FAILED
 
-                destination_path = self.construct_paths(file_creation_month,
-                                                        file_creation_date,
-                                                        self.file_destination_hour_range)
-                month_path = os.path.join(self.config["BaseDirPath"],
-                                          f'{file_creation_month} {self.config["Studio_name"].upper()}')
+        return IngestState.READY
 
-                try:
-                    if self.check_first_file_timestamp(destination_path, source_file):
-                        self.move_file(source_file, destination_path, month_path)
-                        self.destination_path = destination_path
-                    else:
-                        self.run_index(base_path)
+    def find_duplicate(self, source_file, destination_path):
+        if not self.content_hasher or not self.journal:
+            return None, None
 
-                except Exception as e:
-                    logger.error(e)
+        hash_started = time.perf_counter()
+        self.index_destination_hashes(destination_path)
+        content_digest = self.content_hasher.digest(source_file)
+        self.metrics.observe('hash', time.perf_counter() - hash_started)
 
-        if unprocessed_files:
-            time.sleep(int(self.config["FileSizeCheckInterval"]))
-            self.process_files(base_path)
+        duplicate_of = self.journal.find_content_hash(destination_path, content_digest)
+        if duplicate_of and not os.path.isfile(os.path.join(destination_path, duplicate_of)):
+            # the earlier copy was removed from the hour folder, so this one is wanted again
+            self.journal.delete_content_hash(destination_path, duplicate_of)
+            duplicate_of = None
 
-        # if self.destination_path:
-        #     self.chown_files()
+        return content_digest, duplicate_of
+
+    def index_destination_hashes(self, destination_path):
+        # files moved before dedup was enabled are hashed once per run and folder
+        if destination_path in self.hashed_folders:
+            return
+        self.hashed_folders.add(destination_path)
+
+        if not os.path.isdir(destination_path):
+            return
+
+        allowed_extension = self.config["FileExtension"].lower()
+        known_names = self.journal.load_content_hash_names(destination_path)
+
+        with os.scandir(destination_path) as entries:
+            for entry in entries:
+                if entry.name in known_names or entry.name.startswith('.'):
+                    continue
+                if not entry.name.lower().endswith(allowed_extension):
+                    continue
+                try:
+                    if entry.is_file():
+                        self.journal.add_content_hash(destination_path, entry.name, entry.stat().st_size,
+                                                      self.content_hasher.digest(entry.path))
+                except OSError as e:
+                    logger.error(f"Error hashing '{entry.path}': {e}")
+
+    def handle_duplicate(self, source_file, destination_path, duplicate_of):
+        logger.info(f'File {source_file} duplicates {os.path.join(destination_path, duplicate_of)}, '
+                    f'action: {self.duplicate_action}')
+
+        if self.duplicate_action == 'delete':
+            os.remove(source_file)
+            return
+
+        os.makedirs(self.duplicates_path, exist_ok=True)
+        quarantine_file = os.path.join(self.duplicates_path,
+                                       f'{time.strftime("%Y%m%d%H%M%S")}_{os.path.basename(source_file)}')
+        self.file_mover.move(source_file, quarantine_file)
 
     def creation_date_check(self, source_file):
         try:
@@ -171,17 +367,6 @@ class FileCopier:
         except Exception as e:
             logger.error(f'Error getting creation date: {e}')
 
-    def transfer_active_check(self, source_file):
-        initial_size = os.path.getsize(source_file)
-        time.sleep(int(self.config["FileSizeCheckInterval"]))
-        try:
-            current_size = os.path.getsize(source_file)
-
-            if initial_size == current_size:
-                return True
-        except Exception as e:
-            logger.error(f'transfer_active_check: {e}; source file: {source_file}')
-
     def run(self):
         studio_root_path = self.config["BaseDirPath"]
         root_path_message = f'studio root path: {studio_root_path}'
@@ -193,11 +378,137 @@ class FileCopier:
 
         logger.info(root_path_message)
 
-        while True:
+        self.open_journal()
+
+        metrics_server = None
+        if self.config.get("MetricsPort"):
+            try:
+                metrics_server = MetricsServer(self.metrics, int(self.config.get("MetricsPort")))
+                metrics_server.start()
+            except Exception as e:
+                logger.error(f'Error starting metrics endpoint: {e}')
+                metrics_server = None
+
+        try:
+            self.run_ingest(studio_root_path)
+        finally:
+            if metrics_server:
+                metrics_server.stop()
+            self.close_journal()
+
+    def run_ingest(self, studio_root_path):
+        if self.config.get("WatchMode", "poll").lower() == "inotify":
+            try:
+                self.run_watcher(studio_root_path)
+                return
+            except InotifyUnavailable as e:
+                logger.warning(f'inotify watcher unavailable, falling back to polling: {e}')
+
+        while not self.stop_event.is_set():
             # self.delete_outdated_folders()
             self.process_files(studio_root_path)
+            self.seal_hour_folders()
+            self.prune_journal()
+
+            self.stop_event.wait(int(self.config["IterationSleepTime"]))
+
+    def run_watcher(self, studio_root_path):
+        watcher = InotifyWatcher(studio_root_path)
+        logger.info(f'inotify watcher started for {studio_root_path}')
+
+        # the thread gets a copy of the context, so its log records still carry the studio
+        watcher_thread = threading.Thread(target=contextvars.copy_context().run, args=(self.watch_events, watcher),
+                                          daemon=True, name=f'{threading.current_thread().name}/inotify')
+        watcher_thread.start()
+
+        pending_files = set()
+        # names from IN_CLOSE_WRITE / IN_MOVED_TO events, their writer is done, so they skip the size poll
+        closed_files = set()
+        self.collect_queued_files(pending_files, closed_files, None)
+
+        while not self.stop_event.is_set():
+            try:
+                self.collect_queued_files(pending_files, closed_files,
+                                          self.work_queue.get(timeout=int(self.config["IterationSleepTime"])))
+                while True:
+                    self.collect_queued_files(pending_files, closed_files, self.work_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if self.stop_event.is_set():
+                break
+            if not watcher_thread.is_alive():
+                raise InotifyUnavailable('watcher thread stopped')
+
+            if pending_files:
+                self.process_files(studio_root_path, sorted(pending_files), closed_files)
+                closed_files = set()
+                pending_files = {filename for filename in pending_files
+                                 if os.path.isfile(os.path.join(studio_root_path, filename))}
+
+            self.seal_hour_folders()
+            self.prune_journal()
+
+    def seal_hour_folders(self):
+        if not self.seal_queues or not self.journal:
+            return
+
+        now = time.time()
+        quiet_period = int(self.config.get("SealQuietSeconds", 120))
+
+        try:
+            hour_folders = self.journal.load_unsealed_hour_folders()
+        except Exception as e:
+            logger.error(f'Error reading hour folders from the journal: {e}')
+            return
+
+        for destination_path, first_moved_at, last_moved_at, files_count in hour_folders:
+            hour_range_end = self.hour_range_end(destination_path)
+            if now - last_moved_at < quiet_period or hour_range_end is None or now < hour_range_end:
+                continue
+
+            event = {
+                'studio': self.config["Studio_name"],
+                'folder_path': destination_path,
+                'hour_range': os.path.basename(destination_path),
+                'files_count': files_count,
+                'first_moved_at': first_moved_at,
+                'last_moved_at': last_moved_at,
+                'sealed_at': now,
+            }
+            try:
+                for seal_queue in self.seal_queues:
+                    seal_queue.publish(event)
+                self.journal.mark_hour_folder_sealed(destination_path, now)
+                logger.info(f'hour folder {destination_path} sealed, files: {files_count}')
+            except Exception as e:
+                logger.error(f'Error sealing hour folder {destination_path}: {e}')
 
-            time.sleep(int(self.config["IterationSleepTime"]))
+    def collect_queued_files(self, pending_files, closed_files, filename):
+        if filename is stop_signal:
+            return
+        allowed_extension = self.config["FileExtension"].lower()
+        # None is queued after an inotify overflow, when events were lost and a full scan is needed;
+        # the files it finds go through the size poll
+        filenames = os.listdir(self.config["BaseDirPath"]) if filename is None else [filename]
+        filenames = [name for name in filenames if name.lower().endswith(allowed_extension)]
+        pending_files.update(filenames)
+        if filename is not None:
+            closed_files.update(filenames)
+
+    def watch_events(self, watcher):
+        try:
+            while not self.stop_event.is_set():
+                for mask, filename in watcher.read_events(timeout=1):
+                    if mask & IN_Q_OVERFLOW:
+                        logger.warning('inotify queue overflow, scheduling full scan')
+                        self.work_queue.put(None)
+                    elif filename and not mask & IN_ISDIR:
+                        self.work_queue.put(filename)
+        except Exception as e:
+            logger.error(f'inotify watcher error: {e}')
+        finally:
+            watcher.close()
 
     # def delete_outdated_folders(self):
     #     current_date = datetime.now(self.studio_timezone).strftime('%d')
@@ -249,46 +560,45 @@ class FileCopier:
 
     def check_first_file_timestamp(self, destination_path, source_file):
 
-        delay_time = int(config.get("FirstFileDelayTime")) if config.get("FirstFileDelayTime") else 10
+        delay_time = int(self.config.get("FirstFileDelayTime")) if self.config.get("FirstFileDelayTime") else 10
 
         if not os.path.exists(destination_path):
             source_file_creation_time = self.get_creation_time(source_file)
 
             if destination_path not in self.first_file_timestamp:
                 self.first_file_timestamp[destination_path] = source_file_creation_time
+                if self.journal:
+                    self.journal.set_first_file_timestamp(destination_path, source_file_creation_time)
             else:
                 current_time = datetime.now().astimezone(self.studio_timezone)
                 delta = current_time - datetime.fromtimestamp(source_file_creation_time, self.studio_timezone)
                 if delta > timedelta(minutes=delay_time):
                     del self.first_file_timestamp[destination_path]
+                    if self.journal:
+                        self.journal.delete_first_file_timestamp(destination_path)
                     return True
         else:
             return True
 
     def run_index(self, destination_subdir):
-        setproctitle.setproctitle("copy_script_run_index")
-
-        destination_subdir = destination_subdir.replace('/cloud', '')
-        formatted_dest_subdir = self.modify_path_for_index(destination_subdir)
-
-        command = f'sudo -u www-data php /var/www/cloud/occ files:scan -p {formatted_dest_subdir} --shallow'
-
+        index_started = time.perf_counter()
+        # done callbacks run in the index client thread, outside the context the request was made in
+        context = contextvars.copy_context()
+        index_client.request_index(destination_subdir).add_done_callback(
+            lambda future: context.run(self.log_index_result, future, index_started))
+
+    def log_index_result(self, future, index_started):
+        self.metrics.observe('index', time.perf_counter() - index_started)
         try:
-            process = subprocess.run(
-                command,
-                shell=True,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-
-            if process.returncode != 0:
-                logger.error(f"Error executing command: {command}, stderr: {process.stderr.decode()}")
-
-            logger.info(f"Console output: {process.stdout.decode()}")
-
+            result = future.result()
         except Exception as e:
-            logger.error(f"Error executing command: {command}, {e}")
+            logger.error(f"Error indexing: {e}")
+            return
+
+        if result.get('ok'):
+            logger.info(f"Console output: {result.get('output')}")
+        else:
+            logger.error(f"Error indexing {result.get('path')}: {result.get('output')}")
 
     def generate_and_store_share_folder_url(self, path):
         path_for_share = self.modify_path_for_share_folder(path)
@@ -300,14 +610,6 @@ class FileCopier:
             if self.yclients_service.client_info:
                 self.save_shared_folder()
 
-    @staticmethod
-    def modify_path_for_index(destination_subdir):
-        folders = destination_subdir.split(os.path.sep)
-        wrapped_folders = ['"' + folder + '"' if folder else '' for folder in folders]
-        wrapped_path = os.path.sep.join(wrapped_folders)
-
-        return wrapped_path
-
     @staticmethod
     def modify_path_for_share_folder(path):
         new_path = path.split('/files/')[1]
@@ -328,42 +630,11 @@ class FileCopier:
     @staticmethod
     def get_creation_time(file_path):
         try:
-            mod_command = ['stat', '-c', '%Y', file_path]
-            mod_result = subprocess.run(mod_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
-                                        check=True)
-            modification_time_stat = float(mod_result.stdout.strip())
-
-            create_command = ['stat', '-c', '%W', file_path]
-            create_result = subprocess.run(create_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
-                                           check=True)
-            creation_time_stat = float(create_result.stdout.strip())
-
-            if modification_time_stat < creation_time_stat:
-                return modification_time_stat
-            else:
-                return creation_time_stat
-        except subprocess.CalledProcessError as e:
+            return birth_time_provider.get_birth_time(file_path)
+        except OSError as e:
             logger.error(f"Error get_creation_time: {e}")
             return None
 
-    @staticmethod
-    def change_ownership(directory_path, user='www-data', group='www-data'):
-        try:
-            uid = pwd.getpwnam(user).pw_uid
-            gid = grp.getgrnam(group).gr_gid
-
-            while directory_path != '/':
-                os.chown(directory_path, uid, gid)
-                directory_path = os.path.dirname(directory_path)
-
-        except Exception as e:
-            logger.error(f"Error changing ownership of '{directory_path}' and its parent directories: {e}")
-
-    @staticmethod
-    def change_folder_permissions(folder):
-        command = f'sudo chmod -R g+w "{folder}"'
-        os.system(command)
-
     def get_folder_url(self, folder):
         self.nextcloud_ocs.get_token()
         if self.nextcloud_ocs.csrf_token:
@@ -379,39 +650,26 @@ class FileCopier:
             return
 
     def save_shared_folder(self):
-
-        filename = f'/cloud/reflect/files/Рассылка/{studio_name}_рассылка.json'
-
-        if os.path.isfile(filename):
-            self.shared_folders = self.get_shared_folders(filename)
-
         new_shared_folder = {
             "client_name": self.yclients_service.client_info['client_name'],
             "folder_url": self.nextcloud_ocs.shared_folder_url,
             "client_id": self.yclients_service.client_info['client_id'],
             "client_phone_number": self.yclients_service.client_info['client_phone_number'],
-            "client_email": self.yclients_service.client_info.get('client_email', "")
-
+            "client_email": self.yclients_service.client_info.get('client_email', ""),
+            "date": datetime.now(self.studio_timezone).strftime('%d.%m.%Y')
         }
 
-        self.shared_folders.append(new_shared_folder)
-        self.update_shared_folders_file(filename)
-        self.change_ownership(filename)
-        self.run_index('/cloud/reflect/files/Рассылка/')
+        mailing_journal = MailingJournal(self.config["Studio_name"])
+        mailing_journal.append(new_shared_folder)
+        self.permission_manager.ensure_directory(mailing_journal.base_path)
+        self.permission_manager.ensure_file(mailing_journal.journal_file)
+        self.mailing_updated = True
 
-    @staticmethod
-    def get_shared_folders(filename):
-        with open(filename, 'r', encoding='utf-8') as file:
-            return json.load(file)['shared_folders']
-
-    def update_shared_folders_file(self, filename):
-        current_date = datetime.now(self.studio_timezone).strftime('%d.%m.%Y')
-        shared_folders_data = {
-            'date': current_date,
-            'shared_folders': self.shared_folders
-        }
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(shared_folders_data, file, indent=4)
+    def index_mailing_folder(self):
+        # one scan of the mailing folder per process_files round, however many folders were shared
+        if self.mailing_updated:
+            self.mailing_updated = False
+            self.run_index(mailing_path)
 
 
 def read_config(config_file):
@@ -428,6 +686,7 @@ if __name__ == "__main__":
 
     studio_config_file = sys.argv[1]
     config = read_config(studio_config_file)
+    check_seal_events([studio_config_file])
 
     try:
         studio_name = config.get("Studio_name")
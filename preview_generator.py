@@ -0,0 +1,121 @@
+import contextvars
+import hashlib
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+
+from dotenv import load_dotenv
+from loguru import logger
+from PIL import Image, ImageOps
+
+load_dotenv()
+preview_cache_dir = environ.get('PREVIEW_CACHE_DIR', '/cloud/copy_script/preview_cache')
+preview_workers = int(environ.get('PREVIEW_WORKERS', 2))
+preview_cache_days = float(environ.get('PREVIEW_CACHE_DAYS', 30))
+
+# (max side, JPEG quality); 700/55 is what clients_bot sends
+preview_sizes = ((700, 55),)
+
+
+class PreviewGenerator:
+    """
+    Downscaled copies of ingested photos in a cache directory outside the cloud. JPEGs are decoded
+    in draft mode, so the decoder scales by 1/2..1/8 while reading and never builds the full-size
+    bitmap. Cache names include the source mtime and size, so a replaced or modified original gets a
+    new preview. Enhanced copies live in the _RS folder and have previews of their own.
+    """
+
+    def __init__(self, cache_dir=preview_cache_dir, workers=preview_workers, sizes=preview_sizes):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.sizes = sizes
+        self.executor = None
+        self.lock = threading.Lock()
+        self.last_prune = 0
+
+    def submit(self, image_path, sizes=None):
+        with self.lock:
+            if not self.executor:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preview')
+        context = contextvars.copy_context()
+        future = self.executor.submit(context.copy().run, self.generate, image_path, sizes)
+        future.add_done_callback(lambda done: context.run(self.log_failure, done, image_path))
+        return future
+
+    @staticmethod
+    def log_failure(future, image_path):
+        if future.exception():
+            logger.error(f"Error generating previews for '{image_path}': {future.exception()}")
+
+    def preview_path(self, image_path, max_side, stat_result=None):
+        stat_result = stat_result or os.stat(image_path)
+        key = f'{os.path.realpath(image_path)}:{stat_result.st_mtime_ns}:{stat_result.st_size}'
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}_{max_side}.jpg')
+
+    def generate(self, image_path, sizes=None):
+        stat_result = os.stat(image_path)
+        missing = [(max_side, quality) for max_side, quality in sizes or self.sizes
+                   if not os.path.exists(self.preview_path(image_path, max_side, stat_result))]
+        if missing:
+            self.render(image_path, missing, stat_result)
+        self.prune()
+
+    def render(self, image_path, sizes, stat_result):
+        largest = max(max_side for max_side, _ in sizes)
+
+        with Image.open(image_path) as img:
+            img.draft('RGB', (largest, largest))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+
+            for max_side, quality in sorted(sizes, reverse=True):
+                img.thumbnail((max_side, max_side))
+                output_path = self.preview_path(image_path, max_side, stat_result)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                temp_path = f'{output_path}.{threading.get_ident()}.part'
+                img.save(temp_path, 'JPEG', quality=quality)
+                os.replace(temp_path, output_path)
+
+    def cached_preview(self, image_path, max_side, quality):
+        """
+        Cached preview path for image_path, or None on a cache miss. A miss queues the preview on the
+        pool instead of rendering it in the caller, so bot handlers never wait for a decode.
+        """
+        try:
+            output_path = self.preview_path(image_path, max_side)
+        except OSError as e:
+            logger.error(f"Error looking up preview for '{image_path}': {e}")
+            return None
+        if os.path.exists(output_path):
+            return output_path
+        self.submit(image_path, [(max_side, quality)])
+        return None
+
+    def prune(self):
+        now = time.time()
+        with self.lock:
+            if now - self.last_prune < 3600:
+                return
+            self.last_prune = now
+
+        max_age = preview_cache_days * 86400
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                file_path = os.path.join(root, filename)
+                try:
+                    if now - os.stat(file_path).st_mtime > max_age:
+                        os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+
+preview_generator = PreviewGenerator()
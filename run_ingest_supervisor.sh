@@ -0,0 +1,10 @@
+#!/bin/bash
+
+# Activate the virtual environment
+source /cloud/copy_script/cs_env/bin/activate
+
+# Navigate to the directory containing the Python script
+cd /cloud/copy_script
+
+# Run the Python script
+python ingest_supervisor.py
@@ -0,0 +1,58 @@
+import os
+import pytz
+
+from datetime import datetime
+
+month_mapping = {
+    'January': 'Январь',
+    'February': 'Февраль',
+    'March': 'Март',
+    'April': 'Апрель',
+    'May': 'Май',
+    'June': 'Июнь',
+    'July': 'Июль',
+    'August': 'Август',
+    'September': 'Сентябрь',
+    'October': 'Октябрь',
+    'November': 'Ноябрь',
+    'December': 'Декабрь'
+}
+
+
+class StudioPathResolver:
+    def __init__(self, config):
+        self.config = config
+        self.studio_timezone = pytz.timezone(config.get("TimeZoneName"))
+
+    def get_current_month_and_date(self):
+        now = datetime.now(self.studio_timezone)
+        current_month = self.translate_month_to_russian(now.strftime('%B'))
+        current_date = now.strftime('%d.%m')
+        return current_month, current_date
+
+    @staticmethod
+    def translate_month_to_russian(month_name):
+        return month_mapping.get(month_name, month_name)
+
+    def construct_paths(self, current_month, current_date, hour_range):
+        base_path = os.path.join(
+            self.config["BaseDirPath"],
+            f'{current_month} {self.config["Studio_name"].upper()}',
+            current_date,
+            hour_range
+        )
+        return base_path
+
+    def hour_range_end(self, folder_path):
+        """Timestamp when the hour range of a <month>/<dd.mm>/<h-h+1> folder ends, None for other folders."""
+        try:
+            day, month = map(int, os.path.basename(os.path.dirname(folder_path)).split('.'))
+            end_hour = int(os.path.basename(folder_path).split('-')[1])
+        except (ValueError, IndexError):
+            return None
+
+        now = datetime.now(self.studio_timezone)
+        # a December folder looked at in January belongs to the previous year
+        year = now.year if month <= now.month else now.year - 1
+        day_start = self.studio_timezone.localize(datetime(year, month, day))
+        return day_start.timestamp() + end_hour * 3600
@@ -0,0 +1,67 @@
+import grp
+import io
+import os
+import pwd
+import sys
+from configparser import ConfigParser
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# tg_bot reads these at import time; image_enhancer imports it
+os.environ.setdefault('BOT_TOKEN', '0:test')
+os.environ.setdefault('REFLECT_GROUP_CHAT_ID', '0')
+
+
+@pytest.fixture
+def copier(tmp_path):
+    from permissions import PermissionManager
+    from photos_copy_script import FileCopier
+
+    config = {'Studio_name': 'test', 'BaseDirPath': str(tmp_path), 'FileExtension': '.jpg',
+              'TimeZoneName': 'Europe/Moscow', 'IterationSleepTime': '60', 'FileSizeCheckInterval': '1',
+              'JournalFile': str(tmp_path / 'journal.db'),
+              'DuplicatesDir': str(tmp_path.parent / f'{tmp_path.name}_duplicates')}
+    file_copier = FileCopier(config)
+    # the copier chowns every parent of a new folder to www-data, in tests they stay with the current user
+    file_copier.permission_manager = PermissionManager(str(tmp_path), pwd.getpwuid(os.getuid()).pw_name,
+                                                       grp.getgrgid(os.getgid()).gr_name)
+    return file_copier
+
+
+@pytest.fixture
+def make_enhancer():
+    from image_enhancer import ImageEnhancer
+
+    def make(**image_settings):
+        config = ConfigParser()
+        config.read_dict({'Settings': {'Studio_name': 'test', 'BaseDirPath': '/tmp', 'FileExtension': '.jpg',
+                                       'TimeZoneName': 'Europe/Moscow'},
+                          'ImageEnhancement': {'Contrast': '1.1', 'Brightness': '1.05', 'BW_brightness': '1.1',
+                                               'BW_contrast': '1.2', 'ColorSaturation': '1.15', 'Sharpness': '1.6',
+                                               'Temperature': '4', 'SharpFilter': 'False', 'BlurFilter': 'False',
+                                               'Quality': '95', **image_settings}})
+        return ImageEnhancer({'path_settings': config['Settings'], 'image_settings': config['ImageEnhancement']})
+    return make
+
+
+@pytest.fixture
+def photo():
+    """A 640x480 JPEG with gradients, noise and hard edges."""
+    np = pytest.importorskip('numpy')
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:480, 0:640]
+    data = np.stack([x * 255 / 640, y * 255 / 480, (x + y) * 127 / 1120 + 64], axis=-1)
+    data += rng.normal(0, 12, data.shape)
+    image = Image.fromarray(np.clip(data, 0, 255).astype(np.uint8), 'RGB')
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((160, 120, 320, 240), fill=(250, 240, 230))
+    draw.rectangle((320, 240, 480, 360), fill=(10, 20, 30))
+
+    buffer = io.BytesIO()
+    image.filter(ImageFilter.GaussianBlur(1)).save(buffer, 'JPEG', quality=90)
+    buffer.seek(0)
+    image = Image.open(buffer)
+    image.load()
+    return image
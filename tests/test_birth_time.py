@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+import birth_time
+from birth_time import BirthTimeProvider
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / 'a.jpg'
+    path.write_bytes(b'photo')
+    return str(path)
+
+
+def test_older_mtime_wins_over_birth_time(photo):
+    os.utime(photo, (1_600_000_000, 1_600_000_000))
+
+    assert BirthTimeProvider().get_birth_time(photo) == 1_600_000_000
+
+
+def test_birth_time_wins_over_a_later_mtime(photo):
+    provider = BirthTimeProvider()
+    if not provider.read_statx_btime(photo):
+        pytest.skip('the filesystem reports no birth time')
+    future = time.time() + 86400
+    os.utime(photo, (future, future))
+
+    assert provider.get_birth_time(photo) < future
+    assert abs(provider.get_birth_time(photo) - time.time()) < 60
+
+
+def test_missing_birth_time_falls_back_to_mtime(photo):
+    provider = BirthTimeProvider()
+    provider.statx = None
+    os.utime(photo, (1_700_000_000, 1_700_000_000))
+
+    assert provider.get_birth_time(photo) == 1_700_000_000
+
+
+def test_lookups_are_memoized_per_inode_and_mtime(photo, monkeypatch):
+    provider = BirthTimeProvider()
+    calls = []
+    monkeypatch.setattr(provider, 'read_statx_btime', lambda path: calls.append(path) or None)
+
+    provider.get_birth_time(photo)
+    provider.get_birth_time(photo)
+    assert len(calls) == 1
+
+    os.utime(photo, (1_700_000_000, 1_700_000_000))
+    provider.get_birth_time(photo)
+    assert len(calls) == 2
+
+
+def test_cache_is_bounded(photo, monkeypatch):
+    monkeypatch.setattr(birth_time, 'CACHE_MAX_SIZE', 2)
+    provider = BirthTimeProvider()
+    for mtime in (1_600_000_000, 1_600_000_001, 1_600_000_002):
+        os.utime(photo, (mtime, mtime))
+        provider.get_birth_time(photo)
+
+    assert len(provider.cache) == 2
+
+
+def test_missing_file_gives_no_creation_time(tmp_path):
+    from photos_copy_script import FileCopier
+
+    assert FileCopier.get_creation_time(str(tmp_path / 'gone.jpg')) is None
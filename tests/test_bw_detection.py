@@ -0,0 +1,64 @@
+import io
+
+import pytest
+from PIL import Image
+
+from bw_calibration import legacy_is_black_white
+from image_enhancer import ImageEnhancer
+
+np = pytest.importorskip('numpy')
+
+
+def reencode(image):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    buffer.seek(0)
+    image = Image.open(buffer)
+    image.load()
+    return image
+
+
+def distinct_colours(count):
+    # one pixel per colour, each a different shade of red and green
+    pixels = [(i % 256, i // 256, 0) for i in range(count)]
+    image = Image.new('RGB', (count, 1))
+    image.putdata(pixels)
+    return image
+
+
+def test_grayscale_photos_are_black_and_white(photo):
+    gray = photo.convert('L')
+
+    assert ImageEnhancer.is_black_white(gray)
+    assert ImageEnhancer.is_black_white(reencode(gray.convert('RGB')))
+
+
+@pytest.mark.parametrize('noise, black_white', [(1, True), (2, False)])
+def test_near_gray_jpeg_noise_follows_the_old_rule(noise, black_white):
+    rng = np.random.default_rng(0)
+    gray = np.mgrid[0:480, 0:640][1, ..., np.newaxis] * 255 / 640
+    # each channel of a gray gradient jittered on its own, then JPEG compressed
+    image = reencode(Image.fromarray(np.clip(gray + rng.normal(0, noise, (480, 640, 3)), 0, 255).astype(np.uint8)))
+
+    assert ImageEnhancer.is_black_white(image) is black_white
+    assert legacy_is_black_white(image) is black_white
+
+
+def test_colour_photos_are_not_black_and_white(photo):
+    assert not ImageEnhancer.is_black_white(photo)
+    assert not legacy_is_black_white(photo)
+
+
+@pytest.mark.parametrize('count, black_white', [(599, True), (600, False), (5000, False)])
+def test_threshold_matches_the_old_set_of_pixels(count, black_white):
+    image = distinct_colours(count)
+
+    assert ImageEnhancer.is_black_white(image) is black_white
+    assert legacy_is_black_white(image) is black_white
+
+
+def test_palette_images_skip_the_count():
+    image = distinct_colours(300).quantize(256)
+
+    assert image.mode == 'P'
+    assert ImageEnhancer.is_black_white(image)
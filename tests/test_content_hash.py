@@ -0,0 +1,86 @@
+import os
+
+import pytest
+from loguru import logger
+
+from content_hash import ContentHasher
+from photos_copy_script import FileCopier
+
+
+@pytest.fixture
+def dedup_copier(copier):
+    copier.content_hasher = ContentHasher('full')
+    copier.open_journal()
+    yield copier
+    copier.close_journal()
+
+
+def test_sample_mode_reads_only_head_and_tail(tmp_path):
+    head, tail = b'h' * 100, b't' * 100
+    (tmp_path / 'a.jpg').write_bytes(head + b'a' * 1000 + tail)
+    (tmp_path / 'b.jpg').write_bytes(head + b'b' * 1000 + tail)
+
+    sample_hasher = ContentHasher('sample', sample_size=100)
+    assert sample_hasher.digest(str(tmp_path / 'a.jpg')) == sample_hasher.digest(str(tmp_path / 'b.jpg'))
+    assert ContentHasher('full').digest(str(tmp_path / 'a.jpg')) != ContentHasher('full').digest(
+        str(tmp_path / 'b.jpg'))
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ContentHasher('partial')
+
+
+def test_reuploaded_file_is_quarantined(dedup_copier, tmp_path):
+    destination_path = tmp_path / 'month' / '18.10' / '10-11'
+    destination_path.mkdir(parents=True)
+    (destination_path / 'IMG_1.jpg').write_bytes(b'frame one')
+    (tmp_path / 'IMG_1 (1).jpg').write_bytes(b'frame one')
+    (tmp_path / 'IMG_2.jpg').write_bytes(b'frame two')
+
+    _, duplicate_of = dedup_copier.find_duplicate(str(tmp_path / 'IMG_2.jpg'), str(destination_path))
+    assert duplicate_of is None
+
+    _, duplicate_of = dedup_copier.find_duplicate(str(tmp_path / 'IMG_1 (1).jpg'), str(destination_path))
+    assert duplicate_of == 'IMG_1.jpg'
+
+    dedup_copier.handle_duplicate(str(tmp_path / 'IMG_1 (1).jpg'), str(destination_path), duplicate_of)
+
+    assert not (tmp_path / 'IMG_1 (1).jpg').exists()
+    quarantined = os.listdir(dedup_copier.duplicates_path)
+    assert len(quarantined) == 1 and quarantined[0].endswith('_IMG_1 (1).jpg')
+
+
+def test_file_is_wanted_again_once_the_earlier_copy_is_gone(dedup_copier, tmp_path):
+    destination_path = tmp_path / '10-11'
+    destination_path.mkdir()
+    (destination_path / 'IMG_1.jpg').write_bytes(b'frame one')
+    (tmp_path / 'IMG_1.jpg').write_bytes(b'frame one')
+    dedup_copier.index_destination_hashes(str(destination_path))
+
+    os.remove(destination_path / 'IMG_1.jpg')
+    _, duplicate_of = dedup_copier.find_duplicate(str(tmp_path / 'IMG_1.jpg'), str(destination_path))
+
+    assert duplicate_of is None
+    assert dedup_copier.journal.load_content_hash_names(str(destination_path)) == set()
+
+
+def test_duplicates_are_quarantined_outside_the_studio_folder(copier):
+    config = dict(copier.config)
+    del config['DuplicatesDir']
+
+    duplicates_path = FileCopier.get_duplicates_path(config)
+
+    assert not duplicates_path.startswith(config['BaseDirPath'])
+    assert duplicates_path.endswith('/test')
+
+
+def test_duplicates_dir_inside_the_studio_folder_is_warned_about(copier):
+    warnings = []
+    handler_id = logger.add(lambda message: warnings.append(message.record['message']), level='WARNING')
+    try:
+        FileCopier.get_duplicates_path(dict(copier.config, DuplicatesDir=copier.config['BaseDirPath'] + '/.dup'))
+    finally:
+        logger.remove(handler_id)
+
+    assert len(warnings) == 1
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from enhance_manifest import EnhanceManifest, max_attempts
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    enhance_manifest = EnhanceManifest(str(tmp_path / 'manifest.db'))
+    yield enhance_manifest
+    enhance_manifest.close()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / '10-11'
+    path.mkdir()
+    (tmp_path / '10-11_RS').mkdir()
+    for name in ('a.jpg', 'b.jpg'):
+        (path / name).write_bytes(b'photo')
+    return str(path)
+
+
+def test_only_new_or_changed_files_become_pending(manifest, folder):
+    assert manifest.sync_folder(folder)
+    assert manifest.pending_files(folder) == ['a.jpg', 'b.jpg']
+
+    manifest.mark_file(folder, 'a.jpg', True)
+    assert not manifest.sync_folder(folder)
+    assert manifest.pending_files(folder) == ['b.jpg']
+
+    with open(os.path.join(folder, 'a.jpg'), 'ab') as file:
+        file.write(b' retouched')
+    assert manifest.sync_folder(folder)
+    assert manifest.pending_files(folder) == ['a.jpg', 'b.jpg']
+
+
+def test_existing_outputs_count_as_done(manifest, folder):
+    open(folder + '_RS/a.jpg', 'wb').close()
+
+    manifest.sync_folder(folder)
+
+    assert manifest.pending_files(folder) == ['b.jpg']
+
+
+def test_failed_file_is_retried_until_it_settles(manifest, folder):
+    manifest.sync_folder(folder)
+    manifest.mark_file(folder, 'a.jpg', True)
+
+    for _ in range(max_attempts - 1):
+        manifest.mark_file(folder, 'b.jpg', False)
+        assert manifest.pending_files(folder) == ['b.jpg']
+        assert not manifest.is_complete(folder)
+
+    manifest.mark_file(folder, 'b.jpg', False)
+
+    assert manifest.pending_files(folder) == []
+    assert manifest.is_complete(folder)
+
+
+def test_index_follows_the_versions(manifest, folder):
+    manifest.sync_folder(folder)
+    assert manifest.index_needed(folder, 'source')
+    manifest.mark_indexed(folder, 'source')
+    assert not manifest.index_needed(folder, 'source')
+
+    manifest.mark_file(folder, 'a.jpg', True)
+    assert manifest.index_needed(folder, 'output')
+    manifest.mark_indexed(folder, 'output')
+    assert not manifest.index_needed(folder, 'output')
+
+    os.remove(os.path.join(folder, 'b.jpg'))
+    manifest.sync_folder(folder)
+    assert manifest.index_needed(folder, 'source')
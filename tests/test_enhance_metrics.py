@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+
+import pytest
+from PIL import Image
+
+import image_enhancer
+from enhance_metrics import EnhanceMetrics, EnhanceRecord, timed
+from enhance_report import load_records, print_report
+
+
+def record(studio='a', result=None, **values):
+    enhance_record = EnhanceRecord(studio, f'/cloud/{studio}/10-11/1.jpg', 'pil')
+    enhance_record.set(**values)
+    if result:
+        enhance_record.fail(result, ValueError('broken file'))
+    return enhance_record
+
+
+def write_records(metrics_file, count):
+    metrics = EnhanceMetrics(metrics_file)
+    for _ in range(count):
+        metrics.write(record(decode_ms=1.0))
+
+
+def test_stages_are_timed_and_the_first_failure_names_the_result():
+    enhance_record = EnhanceRecord('a', '/cloud/a/1.jpg', 'numpy')
+    with timed(enhance_record, 'decode'):
+        pass
+    with pytest.raises(ValueError):
+        with timed(enhance_record, 'enhance'):
+            raise ValueError('cannot enhance')
+    enhance_record.fail('encode', OSError('disk full'))
+
+    data = enhance_record.finish()
+    assert not enhance_record.ok
+    assert data['result'] == 'enhance_error'
+    assert (data['error'], data['message']) == ('ValueError', 'cannot enhance')
+    assert data['decode_ms'] >= 0 and data['enhance_ms'] >= 0
+    assert 'encode_ms' not in data
+
+
+def test_total_is_the_sum_of_the_stages():
+    data = record(decode_ms=12.5, bw=0, bw_ms=0.4, enhance_ms=100.0, encode_ms=30.25).finish()
+
+    assert data['total_ms'] == 143.2
+
+
+def test_timed_without_a_record_does_nothing():
+    with timed(None, 'decode'):
+        pass
+
+
+def test_records_rotate_and_come_back_oldest_first(tmp_path):
+    metrics = EnhanceMetrics(str(tmp_path / 'metrics.jsonl'), max_mb=100 / 2 ** 20, backups=2)
+    for number in range(6):
+        metrics.write(record(decode_ms=float(number)))
+
+    assert [path.rsplit('/', 1)[1] for path in metrics.metrics_files()] == \
+        ['metrics.jsonl.2', 'metrics.jsonl.1', 'metrics.jsonl']
+    # every record is over 100 bytes, so each file holds one and the oldest three are gone
+    assert [data['decode_ms'] for data in metrics.read_records()] == [3.0, 4.0, 5.0]
+    # the summary keeps counting what rotation dropped
+    assert metrics.read_summary()['a']['images'] == 6
+    assert metrics.read_summary()['a']['decode_ms'] == 15.0
+
+
+def test_broken_lines_are_skipped(tmp_path):
+    metrics = EnhanceMetrics(str(tmp_path / 'metrics.jsonl'))
+    metrics.write(record())
+    with open(metrics.metrics_file, 'a') as file:
+        file.write('{"studio": "a", "res\n')
+    metrics.write(record('b'))
+
+    assert [data['studio'] for data in metrics.read_records()] == ['a', 'b']
+
+
+def test_summary_counts_results_per_studio(tmp_path):
+    metrics = EnhanceMetrics(str(tmp_path / 'metrics.jsonl'))
+    metrics.write(record('a', bytes_in=100, bytes_out=80))
+    metrics.write(record('a', result='decode'))
+    metrics.write(record('b'))
+
+    summary = metrics.read_summary()
+    assert summary['a'] == {'images': 2, 'result_ok': 1, 'result_decode_error': 1, 'bytes_in': 100, 'bytes_out': 80}
+    assert summary['b'] == {'images': 1, 'result_ok': 1}
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    metrics_file = str(tmp_path / 'metrics.jsonl')
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=write_records, args=(metrics_file, 25)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+
+    metrics = EnhanceMetrics(metrics_file)
+    assert len(list(metrics.read_records())) == 100
+    assert metrics.read_summary()['a']['images'] == 100
+    assert metrics.read_summary()['a']['decode_ms'] == 100.0
+
+
+def test_report_lists_studios_slow_images_and_failures(tmp_path, capsys):
+    metrics = EnhanceMetrics(str(tmp_path / 'metrics.jsonl'))
+    metrics.write(record('a', decode_ms=10.0, enhance_ms=900.0))
+    metrics.write(record('a', result='decode', decode_ms=5.0))
+    metrics.write(record('b', enhance_ms=50.0))
+    with open(metrics.metrics_file, 'a') as file:
+        file.write(json.dumps({'time': '2000-01-01T00:00:00', 'studio': 'a', 'result': 'ok'}) + '\n')
+
+    assert len(load_records(metrics, studio='a')) == 3
+    records = load_records(metrics, hours=1)
+    assert len(records) == 3
+
+    print_report(records, metrics.read_summary(), top=1)
+    output = capsys.readouterr().out
+    assert '== a: 2 images, ok 1, decode_error 1' in output
+    assert '== b: 1 images, ok 1' in output
+    assert 'lifetime: ' in output
+    assert '     910 ms  a  /cloud/a/10-11/1.jpg  decode=10 enhance=900' in output
+    assert 'decode_error  ValueError  e.g. /cloud/a/10-11/1.jpg: broken file' in output
+
+
+def test_enhance_file_records_each_photo(make_enhancer, tmp_path, monkeypatch):
+    metrics = EnhanceMetrics(str(tmp_path / 'metrics.jsonl'))
+    monkeypatch.setattr(image_enhancer, 'enhance_metrics', metrics)
+    Image.new('RGB', (64, 48), (200, 100, 50)).save(tmp_path / 'good.jpg', 'JPEG')
+    (tmp_path / 'broken.jpg').write_bytes(b'not a jpeg')
+    enhancer = make_enhancer()
+
+    assert enhancer.enhance_file(str(tmp_path / 'good.jpg'), str(tmp_path / 'good_RS.jpg'))
+    assert not enhancer.enhance_file(str(tmp_path / 'broken.jpg'), str(tmp_path / 'broken_RS.jpg'))
+
+    good, broken = metrics.read_records()
+    # a single-colour photo has fewer than 600 colours, so it counts as black and white
+    assert (good['result'], good['width'], good['height'], good['black_white']) == ('ok', 64, 48, True)
+    assert good['bytes_out'] == (tmp_path / 'good_RS.jpg').stat().st_size
+    assert good['total_ms'] == round(sum(good[f'{stage}_ms'] for stage in ('decode', 'bw', 'enhance', 'encode')), 1)
+    assert (broken['result'], broken['error']) == ('decode_error', 'UnidentifiedImageError')
@@ -0,0 +1,90 @@
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+import image_enhancer
+from enhance_metrics import EnhanceMetrics
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    enhance_metrics = EnhanceMetrics(str(tmp_path / 'enhance_metrics.jsonl'))
+    monkeypatch.setattr(image_enhancer, 'enhance_metrics', enhance_metrics)
+    return enhance_metrics
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / '10-11'
+    folder.mkdir()
+    for number in range(6):
+        Image.new('RGB', (64, 48), (40 * number, 100, 150)).save(folder / f'{number}.jpg', 'JPEG')
+    return str(folder)
+
+
+def run_with_timeout(function, *args):
+    errors = []
+
+    def target():
+        try:
+            function(*args)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), 'enhance_files did not return'
+    return errors
+
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name in ('enhance_reader', 'enhance_writer')]
+
+
+def test_every_photo_is_written_and_recorded(make_enhancer, metrics, folder):
+    new_folder = make_enhancer().enhance_folder(folder)
+
+    assert sorted(os.listdir(new_folder)) == sorted(os.listdir(folder))
+    assert [record['result'] for record in metrics.read_records()] == ['ok'] * 6
+
+
+def test_an_enhance_error_stops_the_reader_and_the_writer(make_enhancer, metrics, folder, monkeypatch):
+    monkeypatch.setattr(image_enhancer, 'pipeline_queue_size', 1)
+    enhancer = make_enhancer()
+    process_image = enhancer.process_image
+    calls = []
+
+    def failing_process_image(image, item, record=None):
+        calls.append(item)
+        if len(calls) == 2:
+            raise MemoryError('out of memory')
+        return process_image(image, item, record)
+
+    monkeypatch.setattr(enhancer, 'process_image', failing_process_image)
+
+    errors = run_with_timeout(enhancer.enhance_files, sorted(enhancer.files_to_enhance(folder)))
+
+    assert [type(error) for error in errors] == [MemoryError]
+    assert not pipeline_threads()
+    # the photo enhanced before the error is still written, the rest stays pending for the next run
+    assert os.listdir(folder + '_RS') == [calls[0]]
+
+
+def test_a_writer_error_does_not_stall_the_pipeline(make_enhancer, metrics, folder, monkeypatch):
+    monkeypatch.setattr(image_enhancer, 'pipeline_queue_size', 1)
+    enhancer = make_enhancer()
+    write_image = enhancer.write_image
+
+    def failing_write_image(enhanced_image, output_path, original_exif, record=None):
+        if output_path.endswith('1.jpg'):
+            raise OSError('disk went away')
+        return write_image(enhanced_image, output_path, original_exif, record)
+
+    monkeypatch.setattr(enhancer, 'write_image', failing_write_image)
+
+    assert run_with_timeout(enhancer.enhance_files, enhancer.files_to_enhance(folder)) == []
+    assert not pipeline_threads()
+    assert sorted(os.listdir(folder + '_RS')) == ['0.jpg', '2.jpg', '3.jpg', '4.jpg', '5.jpg']
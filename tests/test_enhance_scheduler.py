@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from enhance_scheduler import EnhanceScheduler
+
+
+def enhance(result):
+    if result == 'crash':
+        os._exit(1)
+    if result == 'error':
+        raise ValueError('cannot decode')
+    return result
+
+
+@pytest.fixture
+def scheduler():
+    enhance_scheduler = EnhanceScheduler(max_workers=1, job_memory_mb=1)
+    yield enhance_scheduler
+    enhance_scheduler.shutdown()
+
+
+def run_all(scheduler):
+    finished_folders = []
+    for _ in range(100):
+        finished_folders += scheduler.wait(timeout=5)
+        if not scheduler.running and not any(scheduler.studio_queues.values()):
+            return finished_folders
+    raise AssertionError('jobs did not finish')
+
+
+def test_studios_take_turns(scheduler):
+    for key in ('a1', 'a2', 'a3'):
+        scheduler.submit('a', '/a/10-11', key, enhance, True)
+    scheduler.submit('b', '/b/10-11', 'b1', enhance, True)
+
+    assert [scheduler.next_job().key for _ in range(4)] == ['a1', 'b1', 'a2', 'a3']
+    assert scheduler.next_job() is None
+
+
+def test_a_tracked_file_is_not_queued_twice(scheduler):
+    assert scheduler.submit('a', '/a/10-11', 'a1', enhance, True)
+    assert not scheduler.submit('a', '/a/10-11', 'a1', enhance, True)
+    assert scheduler.pending_in_folder('/a/10-11') == 1
+
+
+def test_outcomes_reach_on_done_and_the_folder_finishes(scheduler):
+    outcomes = {}
+    for key, result in (('a1', True), ('a2', False), ('a3', 'error')):
+        scheduler.submit('a', '/a/10-11', key, enhance, result,
+                         on_done=lambda outcome, key=key: outcomes.__setitem__(key, outcome))
+
+    assert run_all(scheduler) == ['/a/10-11']
+    assert outcomes == {'a1': True, 'a2': False, 'a3': False}
+    assert not scheduler.is_tracked('a1')
+    assert scheduler.pending_in_folder('/a/10-11') == 0
+
+
+def test_a_broken_pool_is_restarted_without_an_outcome(scheduler):
+    outcomes = {}
+    scheduler.submit('a', '/a/10-11', 'a1', enhance, 'crash',
+                     on_done=lambda outcome: outcomes.__setitem__('a1', outcome))
+
+    run_all(scheduler)
+
+    assert outcomes == {}
+    assert not scheduler.is_tracked('a1')
+
+    scheduler.submit('a', '/a/10-11', 'a1', enhance, True, on_done=lambda outcome: outcomes.__setitem__('a1', outcome))
+    run_all(scheduler)
+
+    assert outcomes == {'a1': True}
@@ -0,0 +1,30 @@
+from concurrent.futures import Future
+
+import photos_copy_script
+from ingest_tracker import IngestState
+
+
+class FakeIndexClient:
+    def request_index(self, path, shallow=True):
+        future = Future()
+        future.set_result({'path': path, 'ok': True, 'output': ''})
+        return future
+
+
+def test_failed_file_is_counted_once(copier, tmp_path, monkeypatch):
+    monkeypatch.setattr(photos_copy_script, 'index_client', FakeIndexClient())
+    monkeypatch.setattr(copier, 'ingest_file', lambda base_path, filename: IngestState.FAILED)
+    (tmp_path / 'a.jpg').write_bytes(b'photo')
+
+    for _ in range(4):
+        copier.process_files(str(tmp_path))
+
+    assert copier.ingest_table.records['a.jpg'].state == IngestState.FAILED
+    assert copier.metrics.files_total['failed'] == 1
+
+
+def test_every_studio_has_its_own_nextcloud_client(copier):
+    other_copier = photos_copy_script.FileCopier(dict(copier.config, Studio_name='other'))
+
+    assert copier.nextcloud_ocs is copier.nextcloud_ocs
+    assert copier.nextcloud_ocs is not other_copier.nextcloud_ocs
@@ -0,0 +1,109 @@
+import errno
+import os
+
+import pytest
+
+import file_mover
+from file_mover import FileMover
+
+
+def write(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+class OtherDevice:
+    def __init__(self, stat_result):
+        self.stat_result = stat_result
+        self.st_dev = stat_result.st_dev + 1
+
+    def __getattr__(self, name):
+        return getattr(self.stat_result, name)
+
+
+@pytest.fixture
+def hour_folder(tmp_path):
+    path = tmp_path / 'date' / '10-11'
+    path.mkdir(parents=True)
+    return path
+
+
+def test_rename_on_the_same_device(tmp_path, hour_folder):
+    write(tmp_path / 'a.jpg', b'photo')
+    mover = FileMover()
+
+    mover.move(str(tmp_path / 'a.jpg'), str(hour_folder / 'a.jpg'))
+
+    assert read(hour_folder / 'a.jpg') == b'photo'
+    assert not (tmp_path / 'a.jpg').exists()
+    assert mover.method_counts['rename'] == 1
+    assert mover.pending_copies == []
+
+
+def test_copy_keeps_the_source_until_flush(tmp_path, hour_folder, monkeypatch):
+    write(tmp_path / 'a.jpg', b'photo' * 1000)
+    source_stat = os.stat(tmp_path / 'a.jpg')
+    stat = os.stat
+
+    # pretend the source is on another device, so the copy path is taken
+    def fake_stat(path, *args, **kwargs):
+        result = stat(path, *args, **kwargs)
+        if os.fspath(path) == str(tmp_path / 'a.jpg'):
+            return OtherDevice(result)
+        return result
+
+    monkeypatch.setattr(file_mover.os, 'stat', fake_stat)
+    mover = FileMover()
+    mover.move(str(tmp_path / 'a.jpg'), str(hour_folder / 'a.jpg'))
+
+    assert read(hour_folder / 'a.jpg') == b'photo' * 1000
+    assert os.listdir(hour_folder) == ['a.jpg']
+    assert not (hour_folder.parent / FileMover.staging_name).exists()
+    assert mover.is_pending(str(tmp_path / 'a.jpg'))
+    assert (tmp_path / 'a.jpg').exists()
+    assert os.stat(hour_folder / 'a.jpg').st_mtime_ns == source_stat.st_mtime_ns
+
+    mover.flush()
+
+    assert not (tmp_path / 'a.jpg').exists()
+    assert not mover.is_pending(str(tmp_path / 'a.jpg'))
+
+
+def test_short_copy_raises(tmp_path, monkeypatch):
+    write(tmp_path / 'a.jpg', b'photo' * 1000)
+    chunks = iter([100, 0])
+    monkeypatch.setattr(file_mover.os, 'copy_file_range', lambda *args, **kwargs: next(chunks))
+
+    with pytest.raises(OSError) as error:
+        FileMover.copy_file(str(tmp_path / 'a.jpg'), str(tmp_path / 'b.jpg'))
+
+    assert error.value.errno == errno.EIO
+
+
+def test_failed_fsync_keeps_the_copy_pending(tmp_path, hour_folder, monkeypatch):
+    write(tmp_path / 'a.jpg', b'photo')
+    write(hour_folder / 'a.jpg', b'photo')
+    mover = FileMover()
+    mover.pending_copies.append((str(tmp_path / 'a.jpg'), str(hour_folder / 'a.jpg')))
+
+    fsync = os.fsync
+
+    def failing_fsync(fd):
+        raise OSError(errno.EIO, 'fsync failed')
+
+    monkeypatch.setattr(file_mover.os, 'fsync', failing_fsync)
+    mover.flush()
+
+    assert (tmp_path / 'a.jpg').exists()
+    assert mover.is_pending(str(tmp_path / 'a.jpg'))
+
+    monkeypatch.setattr(file_mover.os, 'fsync', fsync)
+    mover.flush()
+
+    assert not (tmp_path / 'a.jpg').exists()
+    assert mover.pending_copies == []
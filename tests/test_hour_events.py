@@ -0,0 +1,85 @@
+import os
+import time
+
+from datetime import datetime, timedelta
+
+from loguru import logger
+
+from hour_events import HourEventQueue, check_seal_events, seal_consumers
+
+
+def test_events_are_kept_until_acknowledged(tmp_path):
+    queue = HourEventQueue('image_enhancer', str(tmp_path))
+    queue.publish({'studio': 'a', 'folder_path': '/cloud/a/10-11'})
+    queue.publish({'studio': 'b', 'folder_path': '/cloud/b/10-11'})
+    queue.publish({'studio': 'a', 'folder_path': '/cloud/a/11-12'})
+
+    events = HourEventQueue('image_enhancer', str(tmp_path)).pending('a')
+    assert [event['folder_path'] for _, event in events] == ['/cloud/a/10-11', '/cloud/a/11-12']
+
+    queue.ack(events[0][0])
+    assert [event['folder_path'] for _, event in queue.pending('a')] == ['/cloud/a/11-12']
+    assert len(queue.pending('b')) == 1
+
+
+def test_partial_and_broken_events_are_not_delivered(tmp_path):
+    queue = HourEventQueue('enhance_caller', str(tmp_path))
+    queue.publish({'studio': 'a', 'folder_path': '/cloud/a/10-11'})
+    event_name = os.listdir(queue.path)[0]
+    with open(os.path.join(queue.path, f'.{event_name}.part'), 'w') as file:
+        file.write('{"studio"')
+    broken_file = os.path.join(queue.path, event_name.replace('.json', '0.json'))
+    with open(broken_file, 'w') as file:
+        file.write('{"studio"')
+
+    assert [event['folder_path'] for _, event in queue.pending('a')] == ['/cloud/a/10-11']
+    assert not os.path.exists(broken_file)
+
+
+def test_wait_returns_on_publish(tmp_path):
+    queue = HourEventQueue('image_enhancer', str(tmp_path))
+    assert not queue.wait(0)
+
+    queue.publish({'studio': 'a', 'folder_path': '/cloud/a/10-11'})
+
+    assert queue.wait(5)
+    queue.close()
+
+
+def test_seal_consumers_skip_unknown_names():
+    assert seal_consumers({'SealEvents': ' image_enhancer, image_enhancer_v2 ,enhance_caller'}) == [
+        'image_enhancer', 'enhance_caller']
+    assert seal_consumers({}) == []
+
+
+def test_check_warns_about_events_nobody_consumes(tmp_path):
+    settings_file = tmp_path / 'a_config.ini'
+    settings_file.write_text('[Settings]\nStudio_name = a\nSealEvents = image_enhancer, enhance_caller, enhancer\n\n'
+                             '[ImageEnhancement]\nenhancer = ai_enhancer\n', encoding='utf-8')
+    warnings = []
+    handler_id = logger.add(lambda message: warnings.append(message.record['message']), level='WARNING')
+    try:
+        check_seal_events([str(settings_file)])
+    finally:
+        logger.remove(handler_id)
+
+    assert len(warnings) == 3
+    assert all(str(settings_file) in warning for warning in warnings)
+
+
+def test_copier_publishes_a_sealed_hour_folder_once(copier, tmp_path):
+    copier.open_journal()
+    copier.seal_queues = [HourEventQueue('image_enhancer', str(tmp_path / 'events'))]
+    date_folder = (datetime.now() - timedelta(days=2)).strftime('%d.%m')
+    hour_folder = os.path.join(str(tmp_path), 'Октябрь TEST', date_folder, '10-11')
+    copier.journal.record_moved_file(hour_folder, time.time() - 3600)
+    copier.journal.record_moved_file(hour_folder, time.time() - 3000)
+
+    copier.seal_hour_folders()
+    copier.seal_hour_folders()
+
+    events = copier.seal_queues[0].pending('test')
+    assert len(events) == 1
+    assert events[0][1]['folder_path'] == hour_folder
+    assert events[0][1]['files_count'] == 2
+    copier.close_journal()
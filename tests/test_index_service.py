@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import index_service
+from index_service import IndexClient, IndexScheduler
+
+
+def count_scans(monkeypatch, tmp_path, seconds=0.3):
+    log_file = tmp_path / 'scans.log'
+    script = 'import sys, time; open(sys.argv[1], "a").write(sys.argv[2] + "\\n"); time.sleep(float(sys.argv[3]))'
+    monkeypatch.setattr(index_service, 'build_scan_command',
+                        lambda path, shallow=True: [sys.executable, '-c', script, str(log_file), path, str(seconds)])
+    return log_file
+
+
+def test_requests_merge_until_the_scan_starts(monkeypatch, tmp_path):
+    log_file = count_scans(monkeypatch, tmp_path)
+
+    async def run():
+        scheduler = IndexScheduler(debounce=0.05, max_parallel=1)
+        futures = [scheduler.submit('/cloud/a')]
+        await asyncio.sleep(0.15)
+        # /cloud/a is running, /cloud/b waits for the only slot
+        futures.append(scheduler.submit('/cloud/b'))
+        await asyncio.sleep(0.1)
+        for _ in range(6):
+            futures.append(scheduler.submit('/cloud/a'))
+            futures.append(scheduler.submit('/cloud/b'))
+            await asyncio.sleep(0.02)
+        return await asyncio.gather(*futures)
+
+    results = asyncio.run(run())
+
+    assert all(result['ok'] for result in results)
+    assert sorted(log_file.read_text().split()) == ['/a', '/a', '/b']
+
+
+def test_recursive_request_absorbs_a_queued_child(monkeypatch, tmp_path):
+    log_file = count_scans(monkeypatch, tmp_path, seconds=0)
+
+    async def run():
+        scheduler = IndexScheduler(debounce=0.05, max_parallel=1)
+        child = scheduler.submit('/cloud/a/10-11')
+        parent = scheduler.submit('/cloud/a', shallow=False)
+        return await asyncio.gather(child, parent)
+
+    child_result, parent_result = asyncio.run(run())
+
+    assert child_result == parent_result
+    assert log_file.read_text().split() == ['/a']
+
+
+def test_client_merges_waiting_requests_and_bounds_the_queue(monkeypatch):
+    client = IndexClient(max_queued=2)
+    client.executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    sent = []
+
+    def send_request(path, shallow=True):
+        release.wait(5)
+        sent.append(path)
+        return {'path': path, 'ok': True}
+
+    monkeypatch.setattr(client, 'send_request', send_request)
+
+    busy = client.request_index('/cloud/a')
+    while client.queued_requests:
+        pass
+    first, second = client.request_index('/cloud/b'), client.request_index('/cloud/b/')
+    other = client.request_index('/cloud/c')
+    dropped = client.request_index('/cloud/d')
+
+    assert first is second
+    assert dropped.result()['ok'] is False
+
+    release.set()
+    for future in (busy, first, other):
+        assert future.result(5)['ok']
+    assert sent == ['/cloud/a', '/cloud/b', '/cloud/c']
+    client.executor.shutdown()
@@ -0,0 +1,62 @@
+import time
+
+from ingest_journal import IngestJournal
+from ingest_tracker import IngestRecord, IngestState, IngestTable
+
+
+def make_record(name, state):
+    record = IngestRecord(name, 5, 1000)
+    record.set_state(state)
+    return record
+
+
+def test_records_survive_a_restart(tmp_path):
+    journal = IngestJournal(str(tmp_path / 'journal.db'))
+    journal.sync_records([make_record('a.jpg', IngestState.READY), make_record('b.jpg', IngestState.FAILED)])
+    journal.set_first_file_timestamp('/cloud/a/10-11', 123.0)
+    journal.close()
+
+    journal = IngestJournal(str(tmp_path / 'journal.db'))
+    table = IngestTable('.jpg')
+    table.restore(journal.load_records())
+
+    assert table.files_in_state(IngestState.READY) == ['a.jpg']
+    assert table.files_in_state(IngestState.FAILED) == ['b.jpg']
+    assert journal.load_first_file_timestamps() == {'/cloud/a/10-11': 123.0}
+
+
+def test_sync_writes_only_changed_rows(tmp_path):
+    journal = IngestJournal(str(tmp_path / 'journal.db'))
+    ready, failed = make_record('a.jpg', IngestState.READY), make_record('b.jpg', IngestState.FAILED)
+    journal.sync_records([ready, failed])
+    changes = journal.connection.total_changes
+
+    journal.sync_records([ready, failed])
+    assert journal.connection.total_changes == changes
+
+    ready.set_state(IngestState.MOVED)
+    journal.sync_records([ready])
+    assert journal.connection.total_changes == changes + 2
+    assert [(name, state) for name, _, _, state, *_ in journal.load_records()] == [('a.jpg', 'moved')]
+
+
+def test_prune_keeps_recent_and_unsealed_folders(tmp_path):
+    journal = IngestJournal(str(tmp_path / 'journal.db'))
+    old = time.time() - 5 * 86400
+    journal.record_moved_file('/cloud/old_sealed', old)
+    journal.mark_hour_folder_sealed('/cloud/old_sealed', old + 60)
+    journal.record_moved_file('/cloud/old_unsealed', old)
+    journal.record_moved_file('/cloud/recent')
+    journal.add_content_hash('/cloud/recent', 'a.jpg', 5, 'digest')
+    journal.connection.execute('INSERT INTO content_hashes VALUES (?, ?, ?, ?, ?)',
+                               ('/cloud/old_sealed', 'b.jpg', 5, 'digest', old))
+
+    journal.prune(2)
+
+    assert sorted(row[0] for row in journal.load_hour_folders()) == ['/cloud/old_unsealed', '/cloud/recent']
+    assert journal.load_content_hash_names('/cloud/old_sealed') == set()
+    assert journal.load_content_hash_names('/cloud/recent') == {'a.jpg'}
+
+    journal.prune(2, sealed_only=False)
+
+    assert [row[0] for row in journal.load_hour_folders()] == ['/cloud/recent']
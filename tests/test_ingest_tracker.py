@@ -0,0 +1,80 @@
+import os
+
+from ingest_tracker import IngestState, IngestTable
+
+
+def write(path, data=b'photo'):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def test_file_becomes_ready_once_size_and_mtime_settle(tmp_path):
+    write(tmp_path / 'a.jpg')
+    table = IngestTable('.jpg')
+
+    assert table.scan(str(tmp_path)) == []
+    assert table.scan(str(tmp_path)) == ['a.jpg']
+    assert table.records['a.jpg'].state == IngestState.READY
+
+
+def test_growing_file_is_stabilizing(tmp_path):
+    write(tmp_path / 'a.jpg')
+    table = IngestTable('.jpg')
+    table.scan(str(tmp_path))
+
+    write(tmp_path / 'a.jpg', b'photo and more')
+    table.scan(str(tmp_path))
+
+    assert table.records['a.jpg'].state == IngestState.STABILIZING
+
+
+def test_held_file_deleted_outside_the_events_is_dropped(tmp_path):
+    write(tmp_path / 'a.jpg')
+    write(tmp_path / 'b.jpg')
+    table = IngestTable('.jpg')
+    table.scan(str(tmp_path))
+    table.scan(str(tmp_path))
+    assert table.files_in_state(IngestState.READY) == ['a.jpg', 'b.jpg']
+
+    os.remove(tmp_path / 'a.jpg')
+    write(tmp_path / 'c.jpg')
+    table.scan(str(tmp_path), {'c.jpg'})
+
+    assert sorted(table.records) == ['b.jpg', 'c.jpg']
+
+
+def test_restored_record_of_a_vanished_file_is_dropped(tmp_path):
+    table = IngestTable('.jpg')
+    table.restore([('gone.jpg', 5, 1, 'failed', 0.0, 0.0, None, 0.0)])
+
+    table.scan(str(tmp_path), set())
+
+    assert table.records == {}
+
+
+def test_final_states_are_not_restored():
+    table = IngestTable('.jpg')
+    table.restore([('a.jpg', 5, 1, 'moved', 0.0, 0.0, 1.0, 1.0),
+                   ('b.jpg', 5, 1, 'ready', 0.0, 0.0, 1.0, 1.0)])
+
+    assert list(table.records) == ['b.jpg']
+
+
+def test_closed_file_is_ready_on_the_first_scan(tmp_path):
+    write(tmp_path / 'a.jpg')
+    write(tmp_path / 'b.jpg')
+    table = IngestTable('.jpg')
+
+    assert table.scan(str(tmp_path), {'a.jpg', 'b.jpg'}, {'a.jpg'}) == ['a.jpg']
+    assert table.records['b.jpg'].state == IngestState.SEEN
+
+
+def test_closed_file_that_changed_is_ready_again(tmp_path):
+    write(tmp_path / 'a.jpg')
+    table = IngestTable('.jpg')
+    table.scan(str(tmp_path))
+
+    write(tmp_path / 'a.jpg', b'photo and more')
+
+    assert table.scan(str(tmp_path), {'a.jpg'}, {'a.jpg'}) == ['a.jpg']
+    assert table.records['a.jpg'].size == len(b'photo and more')
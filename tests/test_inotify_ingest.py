@@ -0,0 +1,30 @@
+import threading
+import time
+
+from ingest_tracker import IngestState
+
+
+def test_closed_file_is_ingested_without_the_size_poll(copier, tmp_path, monkeypatch):
+    copier.config['FileSizeCheckInterval'] = '60'
+    copier.config['IterationSleepTime'] = '60'
+    monkeypatch.setattr(copier, 'run_index', lambda path: None)
+    ingested = threading.Event()
+
+    def ingest_file(base_path, filename):
+        (tmp_path / filename).unlink()
+        ingested.set()
+        return IngestState.MOVED
+
+    monkeypatch.setattr(copier, 'ingest_file', ingest_file)
+    thread = threading.Thread(target=copier.run_watcher, args=(str(tmp_path),))
+    thread.start()
+    try:
+        time.sleep(0.3)
+        started = time.monotonic()
+        (tmp_path / 'a.jpg').write_bytes(b'photo')
+
+        assert ingested.wait(5)
+        assert time.monotonic() - started < 1
+    finally:
+        copier.stop()
+        thread.join(10)
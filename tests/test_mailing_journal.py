@@ -0,0 +1,52 @@
+import json
+
+from mailing_journal import MailingJournal
+
+
+def test_appended_entries_are_read_back_in_order(tmp_path):
+    journal = MailingJournal('Отражение', str(tmp_path))
+    journal.append({'folder': '10-11', 'phone': '79990000001'})
+    journal.append({'folder': '11-12', 'phone': '79990000002', 'date': '17.10.2026'})
+
+    entries = journal.read()
+
+    assert [entry['folder'] for entry in entries] == ['10-11', '11-12']
+    assert entries[0]['date']
+    assert MailingJournal.mailing_date(entries) == '17.10.2026'
+    assert MailingJournal.studio_names(str(tmp_path)) == ['Отражение']
+
+
+def test_broken_line_is_skipped(tmp_path):
+    journal = MailingJournal('a', str(tmp_path))
+    journal.append({'folder': '10-11'})
+    with open(journal.journal_file, 'a', encoding='utf-8') as file:
+        file.write('{"folder": \n')
+    journal.append({'folder': '11-12'})
+
+    assert [entry['folder'] for entry in journal.read()] == ['10-11', '11-12']
+
+
+def test_remove_keeps_entries_appended_after_the_read(tmp_path):
+    journal = MailingJournal('a', str(tmp_path))
+    journal.append({'folder': '10-11', 'date': '18.10.2026'})
+    sent = journal.read()
+    journal.append({'folder': '11-12', 'date': '18.10.2026'})
+
+    remaining = journal.remove_entries(sent)
+
+    assert remaining == [{'folder': '11-12', 'date': '18.10.2026'}]
+    assert journal.read() == remaining
+    assert not [path for path in tmp_path.iterdir() if path.name.endswith('.part')]
+
+
+def test_legacy_file_is_migrated_on_rewrite(tmp_path):
+    journal = MailingJournal('a', str(tmp_path))
+    with open(journal.legacy_file, 'w', encoding='utf-8') as file:
+        json.dump({'date': '16.10.2026', 'shared_folders': [{'folder': '9-10'}, {'folder': '10-11'}]}, file)
+
+    assert journal.read() == [{'folder': '9-10', 'date': '16.10.2026'}, {'folder': '10-11', 'date': '16.10.2026'}]
+
+    journal.remove_entries([{'folder': '9-10', 'date': '16.10.2026'}])
+
+    assert not (tmp_path / 'a_рассылка.json').exists()
+    assert journal.read() == [{'folder': '10-11', 'date': '16.10.2026'}]
@@ -0,0 +1,58 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+
+def engine_difference(make_enhancer, image, **image_settings):
+    pil_image = make_enhancer(**image_settings).enhance_preview(image)
+    numpy_image = make_enhancer(Engine='numpy', **image_settings).enhance_preview(image)
+    return np.abs(np.asarray(pil_image, dtype=np.int16) - np.asarray(numpy_image, dtype=np.int16))
+
+
+@pytest.mark.parametrize('image_settings', [{}, {'SharpFilter': 'True'}, {'Sharpness': '2.0', 'Contrast': '1.3'}])
+@pytest.mark.parametrize('black_white', [False, True])
+def test_numpy_engine_stays_within_the_documented_bound(make_enhancer, photo, image_settings, black_white):
+    if black_white:
+        photo = photo.convert('L').convert('RGB')
+
+    difference = engine_difference(make_enhancer, photo, **image_settings)
+
+    assert difference.mean() < 2
+    assert np.percentile(difference, 99) <= 5
+    assert difference.max() <= 12
+
+
+def test_point_operations_match_pil_exactly(make_enhancer, photo):
+    # without sharpening there is no convolution, so only the point operations are compared
+    assert engine_difference(make_enhancer, photo, Sharpness='1.0').max() == 0
+
+
+def test_missing_numpy_falls_back_to_pil(make_enhancer, monkeypatch):
+    import numpy_enhancer
+
+    monkeypatch.setattr(numpy_enhancer, 'np', None)
+    assert make_enhancer(Engine='numpy').numpy_enhancer is None
+
+
+@pytest.mark.parametrize('strip_rows, height', [(16, 49), (17, 100), (5, 478), (1, 30)])
+@pytest.mark.parametrize('sharp_filter', ['False', 'True'])
+@pytest.mark.parametrize('black_white', [False, True])
+def test_strips_match_the_whole_image(make_enhancer, photo, strip_rows, height, sharp_filter, black_white):
+    # the first three heights leave a shorter last strip, 1 row after 16 row strips; 1 row strips are
+    # thinner than the halo the convolution reads above and below them
+    image = photo.crop((0, 0, photo.width, height))
+    numpy_enhancer = make_enhancer(Engine='numpy', SharpFilter=sharp_filter).numpy_enhancer
+
+    whole = numpy_enhancer.enhance(image, black_white=black_white)
+    strips = numpy_enhancer.enhance_strips(image, black_white, strip_rows)
+
+    assert np.array_equal(np.asarray(whole), np.asarray(strips))
+
+
+def test_memory_budget_switches_to_strips(make_enhancer, photo):
+    # 1 MB at 64 bytes per pixel of a 640 wide image is 25 rows, minus the halo above and below
+    tiled = make_enhancer(Engine='numpy', TileMemoryBudgetMB='1').numpy_enhancer
+    untiled = make_enhancer(Engine='numpy').numpy_enhancer
+
+    assert tiled.strip_rows(photo.width) == 23
+    assert np.array_equal(np.asarray(tiled.enhance(photo)), np.asarray(untiled.enhance(photo)))
@@ -0,0 +1,80 @@
+import os
+import stat
+
+import pytest
+
+from permissions import PermissionManager
+
+
+@pytest.fixture
+def studio_root(tmp_path):
+    root = tmp_path / 'studio'
+    root.mkdir(mode=0o755)
+    os.chmod(root, 0o755)
+    return root
+
+
+@pytest.fixture
+def manager(tmp_path, studio_root):
+    if os.getuid() != 0:
+        pytest.skip('chown to another user needs root')
+    permission_manager = PermissionManager(str(studio_root), 'nobody', 'nogroup')
+    # the walk up to / stops at a prepared directory, so nothing outside tmp_path is touched
+    permission_manager.prepared_directories[str(tmp_path)] = os.stat(tmp_path).st_ino
+    return permission_manager
+
+
+def owner(path):
+    path_stat = os.stat(path)
+    return path_stat.st_uid, path_stat.st_gid
+
+
+def test_new_folders_are_chowned_up_the_tree_and_made_group_writable(manager, tmp_path, studio_root):
+    hour_folder = studio_root / 'Октябрь A' / '18.10' / '10-11'
+    hour_folder.mkdir(parents=True, mode=0o755)
+
+    manager.ensure_directory(str(hour_folder))
+
+    for path in (hour_folder, hour_folder.parent, studio_root):
+        assert owner(path) == (65534, 65534)
+        assert os.stat(path).st_mode & stat.S_IWGRP
+    assert owner(tmp_path) == (0, 0)
+
+
+def test_prepared_folders_are_not_touched_again(manager, studio_root, monkeypatch):
+    hour_folder = studio_root / '10-11'
+    hour_folder.mkdir()
+    manager.ensure_directory(str(hour_folder))
+
+    applied = []
+    monkeypatch.setattr(manager, 'apply', lambda path, path_stat: applied.append(path))
+    manager.ensure_directory(str(hour_folder))
+    assert applied == []
+
+    # a recreated folder has a new inode; the old one is kept so its inode is not reused
+    hour_folder.rename(studio_root / 'old')
+    hour_folder.mkdir()
+    manager.ensure_directory(str(hour_folder))
+    assert applied == [str(hour_folder)]
+
+
+def test_moved_file_is_chowned_and_group_writable(manager, studio_root):
+    photo = studio_root / 'a.jpg'
+    photo.write_bytes(b'photo')
+    os.chmod(photo, 0o644)
+
+    manager.ensure_file(str(photo))
+
+    assert owner(photo) == (65534, 65534)
+    assert stat.S_IMODE(os.stat(photo).st_mode) == 0o664
+
+
+def test_write_permission_is_only_added_inside_the_studio_root(manager, tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    os.chmod(outside, 0o755)
+
+    manager.ensure_directory(str(outside))
+
+    assert owner(outside) == (65534, 65534)
+    assert stat.S_IMODE(os.stat(outside).st_mode) == 0o755
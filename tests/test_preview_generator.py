@@ -0,0 +1,29 @@
+from PIL import Image
+
+from preview_generator import PreviewGenerator
+
+
+def test_cache_miss_is_rendered_in_the_background(tmp_path):
+    image_path = tmp_path / 'a.jpg'
+    Image.new('RGB', (2000, 1000), 'red').save(image_path, 'JPEG')
+    generator = PreviewGenerator(cache_dir=str(tmp_path / 'cache'), workers=1)
+
+    assert generator.cached_preview(str(image_path), 700, 55) is None
+    generator.shutdown()
+
+    preview_path = generator.cached_preview(str(image_path), 700, 55)
+    with Image.open(preview_path) as preview:
+        assert preview.size == (700, 350)
+
+
+def test_modified_original_gets_a_new_preview(tmp_path):
+    image_path = tmp_path / 'a.jpg'
+    Image.new('RGB', (800, 800), 'red').save(image_path, 'JPEG')
+    generator = PreviewGenerator(cache_dir=str(tmp_path / 'cache'), workers=1)
+    generator.generate(str(image_path), [(700, 55)])
+    assert generator.cached_preview(str(image_path), 700, 55)
+
+    Image.new('RGB', (900, 900), 'blue').save(image_path, 'JPEG')
+
+    assert generator.cached_preview(str(image_path), 700, 55) is None
+    generator.shutdown()
@@ -0,0 +1,48 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from loguru import logger
+
+import photos_copy_script
+
+
+@pytest.fixture
+def studio_records():
+    records = []
+    handler_id = logger.add(lambda message: records.append(message.record['message']),
+                            filter=lambda record: record['extra'].get('studio') == 'copier_test')
+    yield records
+    logger.remove(handler_id)
+
+
+class FakeIndexClient:
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def request_index(self, path, shallow=True):
+        return self.executor.submit(lambda: {'path': path, 'ok': True, 'output': 'scanned'})
+
+
+def test_index_result_reaches_the_studio_log(copier, studio_records, monkeypatch):
+    monkeypatch.setattr(photos_copy_script, 'index_client', FakeIndexClient())
+
+    with logger.contextualize(studio='copier_test'):
+        copier.run_index('/cloud/test')
+    FakeIndexClient.executor.submit(lambda: None).result()
+
+    assert 'Console output: scanned' in studio_records
+
+
+def test_stop_wakes_the_watcher(copier):
+    thread = threading.Thread(target=copier.run_watcher, args=(copier.config['BaseDirPath'],))
+    thread.start()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    copier.stop()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert time.monotonic() - started < 5
@@ -0,0 +1,58 @@
+import pytest
+from PIL import Image, ImageChops, ImageEnhance
+
+import image_enhancer
+
+
+def legacy_enhance(enhancer, image, black_white):
+    """adjust_image_temperature and enhance_image as they were before the tone LUT."""
+    if not black_white:
+        r, g, b = image.split()
+        if enhancer.temperature < 0:
+            r = r.point(lambda i: max(0, i + enhancer.temperature))
+            b = b.point(lambda i: min(255, i - enhancer.temperature))
+        else:
+            r = r.point(lambda i: min(255, i + enhancer.temperature))
+            b = b.point(lambda i: max(0, i - enhancer.temperature))
+        image = Image.merge('RGB', (r, g, b))
+
+    image = ImageEnhance.Sharpness(image).enhance(enhancer.sharpness)
+    if black_white:
+        image = ImageEnhance.Brightness(image).enhance(enhancer.bw_brightness_value)
+        image = ImageEnhance.Contrast(image).enhance(enhancer.bw_contrast_value)
+    else:
+        image = ImageEnhance.Color(image).enhance(enhancer.color_saturation_value)
+        image = ImageEnhance.Brightness(image).enhance(enhancer.brightness_value)
+        image = ImageEnhance.Contrast(image).enhance(enhancer.contrast_value)
+    return image
+
+
+@pytest.fixture(autouse=True)
+def empty_lut_cache():
+    image_enhancer.tone_lut_cache.clear()
+
+
+@pytest.mark.parametrize('temperature', ['4', '2.5', '-3.5', '0'])
+@pytest.mark.parametrize('brightness', ['1.05', '0.93', '1'])
+@pytest.mark.parametrize('black_white', [False, True])
+def test_lut_chain_matches_the_old_chain_exactly(make_enhancer, photo, temperature, brightness, black_white):
+    if black_white:
+        photo = photo.convert('L').convert('RGB')
+    enhancer = make_enhancer(Temperature=temperature, Brightness=brightness, BW_brightness=brightness)
+
+    enhanced = enhancer.process_image(photo, 'photo.jpg')
+
+    assert ImageChops.difference(enhanced, legacy_enhance(enhancer, photo, black_white)).getbbox() is None
+
+
+def test_changed_settings_rebuild_the_luts(make_enhancer):
+    assert make_enhancer(Brightness='1.25').brightness_lut()[100] == 125
+    assert make_enhancer(Brightness='0.5').brightness_lut()[100] == 50
+
+
+def test_neutral_settings_skip_the_point_calls(make_enhancer):
+    enhancer = make_enhancer(Temperature='0', Brightness='1', BW_brightness='1')
+
+    assert enhancer.tone_lut() is None
+    assert enhancer.tone_lut(black_white=True) is None
+    assert enhancer.brightness_lut() is None
@@ -2,7 +2,6 @@ import configparser
 import os
 
 import telebot
-import subprocess
 import pwd
 import grp
 import json
@@ -12,6 +11,9 @@ from os import environ
 from dotenv import load_dotenv
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from index_service import index_client
+from mailing_journal import MailingJournal
+
 class TelegramBot:
     load_dotenv()
     token = environ.get("BOT_TOKEN")
@@ -189,23 +191,20 @@ class TelegramBot:
     #         return "Ошибка индексации"
 
     def run_index(self):
-        sudo_password = environ.get('SUDOP')
         full_path = self.current_path
-        path = self.current_path.replace('/cloud', '')
-        command = f"echo {sudo_password} | sudo -S -u www-data php /var/www/cloud/occ files:scan -p '{path}' --shallow"
+        path = self.current_path
         self.current_path = os.path.dirname(self.current_path)
-        self.write_to_log(command)
+        self.write_to_log(f'index request: {path}')
 
-        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        output, error = process.communicate()
+        result = index_client.request_index(path).result()
 
-        if process.returncode == 0:
-            self.write_to_log(output)
+        if result.get('ok'):
+            self.write_to_log(result.get('output'))
             self.update_processed_folders(full_path)
             return "Индексация произведена успешно"
 
         else:
-            self.write_to_log(f'output: {output}, error: {error}')
+            self.write_to_log(f"output: {result.get('output')}, returncode: {result.get('returncode')}")
             return "Ошибка индексации"
 
     def change_ownership(self, user='www-data', group='www-data'):
@@ -244,21 +243,20 @@ class TelegramBot:
 
     def get_studio_shared_folders(self, call):
 
-        shared_folder_file = self.selected_studio + "_рассылка.json"
-        if os.path.exists(os.path.join('/cloud/reflect/files/Рассылка', shared_folder_file)):
-            try:
-                with open(os.path.join('/cloud/reflect/files/Рассылка', shared_folder_file), "r+") as mailing_file:
-                    data = json.load(mailing_file)
-                    self.mailing_date = data.get('date')
-                    self.shared_folders = data.get('shared_folders')
-                    keyboard = self.create_keyboard([x.get('client_name') + '\n' + x.get('client_phone_number')
-                                                     for x in self.shared_folders],
-                                                    ['record' + x.get('client_name') + ' ' +
-                                                     x.get('client_phone_number')
-                                                     for x in self.shared_folders])
-                    self.update_message(call, text=f'Рассылка за {self.mailing_date}', keyboard=keyboard)
-            except Exception as e:
-                self.write_to_log(f'error reading mailing file: {e}')
+        try:
+            self.shared_folders = MailingJournal(self.selected_studio).read()
+        except Exception as e:
+            self.shared_folders = []
+            self.write_to_log(f'error reading mailing file: {e}')
+
+        if self.shared_folders:
+            self.mailing_date = MailingJournal.mailing_date(self.shared_folders)
+            keyboard = self.create_keyboard([x.get('client_name') + '\n' + x.get('client_phone_number')
+                                             for x in self.shared_folders],
+                                            ['record' + x.get('client_name') + ' ' +
+                                             x.get('client_phone_number')
+                                             for x in self.shared_folders])
+            self.update_message(call, text=f'Рассылка за {self.mailing_date}', keyboard=keyboard)
         else:
             keyboard = InlineKeyboardMarkup()
             home_button = InlineKeyboardButton(text="🏠", callback_data="home_clicked")
@@ -416,10 +414,8 @@ class TelegramBot:
 
     def delete_record(self, call):
         phone_number = call.data.split(' ')[1]
-        self.shared_folders = [folder for folder in self.shared_folders if
-                               folder["client_phone_number"] != phone_number]
-
-        self.save_shared_folders()
+        self.save_shared_folders([folder for folder in self.shared_folders if
+                                  folder["client_phone_number"] == phone_number])
 
         if self.shared_folders:
             keyboard = self.create_keyboard([x.get('client_name') + '\n' + x.get('client_phone_number')
@@ -433,17 +429,9 @@ class TelegramBot:
             keyboard.add(home_button)
         self.update_message(call, text=f'Рассылка за: {self.mailing_date}', keyboard=keyboard)
 
-    def save_shared_folders(self):
-        shared_folder_file = self.selected_studio + "_рассылка.json"
+    def save_shared_folders(self, removed_folders):
         try:
-            with open(os.path.join('/cloud/reflect/files/Рассылка', shared_folder_file), "w") as mailing_file:
-                data = {
-                    'date': self.mailing_date,
-                    'shared_folders': self.shared_folders
-                }
-
-                json.dump(data, mailing_file, indent=4)
-
+            self.shared_folders = MailingJournal(self.selected_studio).remove_entries(removed_folders)
         except Exception as e:
             self.write_to_log(f'error writing shared folders: {e}')
 
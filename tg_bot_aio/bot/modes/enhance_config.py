@@ -3,14 +3,14 @@ from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.filters import Command, CommandStart
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message, FSInputFile
 
 from ..bot_setup import logger, form_router, sessions, bot
 from ..sessions import Session
 from ..keyboards import create_kb
 from ..middleware import ChatIDChecker
 from ..service import studio_names, mode_names
-from ..utils import (run_indexing, check_ready_for_index, read_settings_file,
+from ..utils import (run_indexing, check_ready_for_index, read_settings_file, render_enhance_preview,
                      get_studio_config_file, validation_settings_value, write_settings_file)
 
 
@@ -105,13 +105,11 @@ async def handle_parameter_input(message: Message, state: FSMContext):
         old_value,
         message.text)
 
-    if isinstance(result, str):
-        text = result
-    else:
-        settings_file = data.get('config_file')
-        await write_settings_file(settings_file, parameter, message.text)
-        text = f'Значение "{parameter}" установлено: {message.text}'
+    if not isinstance(result, str):
+        await show_preview(message, state, parameter, old_value)
+        return
 
+    text = result
     await state.set_state(ImageSettings.show_parameter)
 
     mock_callback = CallbackQuery(
@@ -123,4 +121,42 @@ async def handle_parameter_input(message: Message, state: FSMContext):
     await process_studio(mock_callback, state, text=text)
     await message.delete()
 
+
+async def show_preview(message: Message, state: FSMContext, parameter, old_value):
+    data = await state.get_data()
+    new_value = message.text
+    await state.update_data(new_value=new_value)
+    await state.set_state(ImageSettings.set_parameter)
+
+    confirm_kb = await create_kb(['Применить', 'Отмена'], ['Применить', 'Отмена'])
+    text = f'{parameter}: {old_value} → {new_value}'
+
+    preview_file = await render_enhance_preview(data.get('config_file'), parameter, new_value)
+    if preview_file:
+        await message.answer_photo(
+            photo=FSInputFile(preview_file),
+            caption=f'{text}\nСлева текущие настройки, справа новые. Применить?',
+            reply_markup=confirm_kb)
+        os.remove(preview_file)
+    else:
+        await message.answer(text=f'{text}\nПревью недоступно. Применить?', reply_markup=confirm_kb)
+    await message.delete()
+
+
+@form_router.callback_query(ImageSettings.set_parameter)
+async def set_parameter(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    parameter = data.get('current_parameter')
+    new_value = data.get('new_value')
+
+    if callback.data == 'Применить':
+        await write_settings_file(data.get('config_file'), parameter, new_value)
+        text = f'Значение "{parameter}" установлено: {new_value}'
+    else:
+        text = f'Значение "{parameter}" не изменено: {data.get("current_value")}'
+
+    await state.set_state(ImageSettings.show_parameter)
+    await process_studio(callback, state, text=text)
+    await callback.message.delete()
+
 form_router.message.middleware(ChatIDChecker())
@@ -9,11 +9,14 @@ from os import environ
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 
+from index_service import request_index_async
 from .bot_setup import logger
 
 load_dotenv()
 
 sudo_password = environ.get('SUDOP')
+enhance_python = environ.get('ENHANCE_PYTHON', '/cloud/copy_script/cs_env/bin/python3')
+enhance_preview_script = environ.get('ENHANCE_PREVIEW_SCRIPT', '/cloud/copy_script/enhance_preview.py')
 
 queue_files_mapping = {
     'http://192.168.0.178:8000': 'ai_enhance_queue_ph_1.json',
@@ -22,17 +25,11 @@ queue_files_mapping = {
 
 
 async def run_indexing(path):
-    path = path.replace('/cloud', '')
-    command = f"echo {sudo_password} | sudo -S -u www-data php /var/www/cloud/occ files:scan -p '{path}' --shallow"
-    path = os.path.dirname(path)
-    logger.info(command)
-
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, error = process.communicate()
-
-    logger.info(output)
+    logger.info(f'index request: {path}')
+    result = await request_index_async(path)
+    logger.info(result.get('output'))
 
-    if process.returncode == 0:
+    if result.get('ok'):
         return "Индексация произведена успешно"
 
     else:
@@ -128,6 +125,27 @@ async def write_settings_file(config_file, key, value):
         config.write(file)
 
 
+async def render_enhance_preview(config_file, key, value, timeout=30):
+    # runs in the enhancer's virtualenv, the bot does not import image_enhancer itself
+    process = await asyncio.create_subprocess_exec(
+        enhance_python, enhance_preview_script, config_file, '--set', f'{key}={value}',
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        cwd=os.path.dirname(enhance_preview_script))
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        logger.error(f'enhance preview for {config_file} timed out')
+        return None
+
+    if process.returncode != 0:
+        logger.error(f'enhance preview for {config_file} failed: {stderr.decode(errors="ignore").strip()}')
+        return None
+
+    preview_file = stdout.decode().strip().splitlines()[-1] if stdout.strip() else ''
+    return preview_file if os.path.isfile(preview_file) else None
+
+
 async def add_to_ai_queue(folder, studio_name, action=None):
     ai_queue_file_path = await get_ai_enhance_queue_file(studio_name)
     ai_index_queue = await get_ai_queue(ai_queue_file_path)
@@ -1,4 +1,8 @@
 import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from bot.bot_setup import bot, dp, logger
 from bot.handlers import handler_commands, handler_texts, handler_callback